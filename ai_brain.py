@@ -2,23 +2,47 @@
 AI Brain module - handles ChatGPT integration
 """
 import asyncio
-from openai import AsyncOpenAI
+import json
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass
 import config
-from typing import List, Dict
+from typing import AsyncIterator, Deque, List, Dict, Optional, Set, Tuple
 from data.db import AppDb, UserMessage
+from utils.response_cache import ResponseCache
+from utils.prompt_builder import PromptBuilder
+from utils.llm_pool import LLMPool
+
+# End of sentence: punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r'[.!?…]+[\)"»\']*\s+')
+
+DIGEST_PROMPT = """Ты ведешь короткие заметки о зрителях стрима.
+Обнови заметку о зрителе по его новым сообщениям: кто он, чем интересуется,
+о чем вы говорили. Только факты, максимум 2-3 предложения, на русском языке.
+Ответь только текстом заметки."""
+
+BATCH_PROMPT = """Ниже несколько сообщений из чата. Ответь на каждое отдельно, по тем же правилам.
+Верни только JSON: {"replies": [{"id": <номер сообщения>, "reply": "<ответ>"}, ...]}
+"""
+
+
+@dataclass
+class UserMemory:
+    """What the AI remembers about one chatter"""
+    lines: Deque[str]  # Messages not covered by the digest, oldest first
+    digest: str = ""  # Summary of older messages
+    digest_message_id: int = 0  # Last message id included in the digest
 
 class AIBrain:
     """Handles AI responses using OpenAI ChatGPT"""
     
     def __init__(self):
         """Initialize AI brain"""
-        # Use Groq API (OpenAI-compatible, FREE!)
-        self.client = AsyncOpenAI(
-            api_key=config.OPENAI_API_KEY,  # Will use Groq key
-            base_url="https://api.groq.com/openai/v1"
-        )
+        # Groq (OpenAI-compatible, FREE!) and optional fallbacks from config.LLM_ENDPOINTS
+        self.llm = LLMPool.from_config(config)
         self.conversation_history: List[Dict[str, str]] = []
-        self.max_history = 10  # Keep last 10 messages for context
+        self.max_history = 20  # Stored messages, prompt size is limited by PROMPT_TOKEN_BUDGET
+        self.prompt_builder = PromptBuilder(config.PROMPT_TOKEN_BUDGET)
         
         # Initialize with character personality
         self.system_prompt = f"""Ты {config.CHARACTER_NAME} - виртуальная стримерша на Twitch.
@@ -40,6 +64,31 @@ class AIBrain:
         })
         
         self.db = AppDb()
+        
+        # Digest + last messages of each chatter (ring buffers, LRU across chatters)
+        self.user_history: OrderedDict[str, UserMemory] = OrderedDict()
+        self.active_users: Set[str] = set()  # Wrote since the last digest pass
+        
+        # Cache for repeated questions ("привет", "как дела", ...)
+        self.response_cache = ResponseCache(
+            max_size=config.RESPONSE_CACHE_SIZE,
+            ttl=config.RESPONSE_CACHE_TTL,
+            max_variants=config.RESPONSE_CACHE_VARIANTS,
+            max_key_length=config.RESPONSE_CACHE_MAX_KEY_LENGTH,
+        )
+
+    async def warm_up(self) -> bool:
+        """
+        Connect to LLM endpoints before the first chat message
+        
+        Returns:
+            True if at least one endpoint answered
+        """
+        results = await self.llm.warm_up(config.STARTUP_TIMEOUT)
+        for name, seconds in results.items():
+            if seconds is not None:
+                print(f"✓ LLM {name} готов ({seconds * 1000:.0f} мс)")
+        return any(seconds is not None for seconds in results.values())
 
     async def get_response(self, username: str, message: str) -> str:
         """
@@ -53,53 +102,446 @@ class AIBrain:
             AI generated response
         """
         try:
-            last_messages = self.db.get_user_messages(username)
-            for msg in last_messages:
-                user_message = f"{username} спрашивает: {msg}"
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": user_message
-                })
-                    
-            # Add user message to history
-            user_message = f"{username} спрашивает: {message}"
+            key = self.response_cache.make_key(message)
+            if key:
+                cached = await self._get_cached(key, username, message)
+                if cached is not None:
+                    return cached
+            
+            ai_response = None
+            try:
+                ai_response = await self._complete(username, message)
+            finally:
+                if key:
+                    self.response_cache.finish(key, username, ai_response)
+            return ai_response
+            
+        except Exception as e:
+            print(f"❌ Ошибка AI: {e}")
+            return "Ой, что-то пошло не так... 😅"
+    
+    async def _complete(self, username: str, message: str, record: bool = True) -> str:
+        """Request a full (non-streamed) completion"""
+        messages = self._prepare_messages(username, message, record)
+        
+        # Get response from Groq (FREE!) or a fallback endpoint
+        response = await self.llm.create(
+            messages=messages,
+            max_tokens=config.RESPONSE_MAX_TOKENS,
+            temperature=0.9,  # More creative responses
+        )
+        
+        ai_response = response.choices[0].message.content.strip()
+        
+        # Limit response length
+        if len(ai_response) > config.MAX_RESPONSE_LENGTH:
+            ai_response = ai_response[:config.MAX_RESPONSE_LENGTH] + "..."
+        
+        self._remember_response(ai_response)
+        return ai_response
+    
+    async def get_batch_responses(self, items: List[Tuple[str, str]]) -> List[str]:
+        """
+        Answer several chat messages with one completion
+        
+        Cached answers are used as usual, the rest go to the model in one
+        request that asks for JSON with a reply per message. Messages whose
+        reply can't be parsed are answered one by one.
+        
+        Args:
+            items: (username, message) pairs
+            
+        Returns:
+            Responses in the same order
+        """
+        responses: List[Optional[str]] = [None] * len(items)
+        keys: Dict[int, str] = {}
+        pending: List[int] = []
+        
+        for i, (username, message) in enumerate(items):
+            key = self.response_cache.make_key(message)
+            if key:
+                try:
+                    responses[i] = await self._get_cached(key, username, message)
+                except Exception as e:
+                    print(f"❌ Ошибка AI: {e}")
+                    responses[i] = "Ой, что-то пошло не так... 😅"
+                    continue
+                if responses[i] is None:
+                    keys[i] = key  # Our job to compute, finish() below
+            if responses[i] is None:
+                pending.append(i)
+        
+        recorded = False
+        failed = set()
+        try:
+            if len(pending) > 1:
+                recorded = True
+                parsed = await self._complete_batch([items[i] for i in pending])
+                for i, reply in zip(pending, parsed):
+                    responses[i] = reply
+                missing = [i for i in pending if responses[i] is None]
+                if missing:
+                    print(f"⚠ Пакетный ответ неполный, отвечаю отдельно: {len(missing)} из {len(pending)}")
+                pending = missing
+            
+            for i in pending:
+                username, message = items[i]
+                try:
+                    responses[i] = await self._complete(username, message, record=not recorded)
+                except Exception as e:
+                    print(f"❌ Ошибка AI: {e}")
+                    responses[i] = "Ой, что-то пошло не так... 😅"
+                    failed.add(i)
+        finally:
+            for i, key in keys.items():
+                self.response_cache.finish(key, items[i][0], None if i in failed else responses[i])
+        
+        return responses
+    
+    async def _complete_batch(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Request answers for several messages in one completion
+        
+        Every message is added to history and the database here, even if
+        its reply is missing and the caller falls back to _complete().
+        
+        Returns:
+            Reply per message, None where the output couldn't be parsed
+        """
+        recent = self.conversation_history[1:]
+        
+        digests = []
+        listing = []
+        for n, (username, message) in enumerate(items, 1):
+            memory = self._user_memory(username)
+            if memory.digest and username not in {u for u, _ in items[:n - 1]}:
+                digests.append(f"{username}: {memory.digest}")
+            listing.append(f"{n}. {username}: {message}")
             self.conversation_history.append({
                 "role": "user",
-                "content": user_message
+                "content": f"{username} спрашивает: {message}"
             })
-
-            # Save message to database 
-            self.db.add_message(UserMessage(username=username, text=message))
-            
-            # Get response from Groq (FREE!)
-            response = await self.client.chat.completions.create(
-                model="llama-3.3-70b-versatile",  # NEW Groq model (updated Oct 2024)
-                messages=self.conversation_history[-self.max_history:],  # Use recent history
-                max_tokens=150,
-                temperature=0.9,  # More creative responses
+            self._record_message(username, message)
+        
+        memory = None
+        if digests:
+            memory = {"role": "system", "content": "Что ты помнишь о зрителях:\n" + "\n".join(digests)}
+        current = {"role": "user", "content": BATCH_PROMPT + "\n".join(listing)}
+        messages, tokens = self.prompt_builder.build(self.conversation_history[0], current, (), recent, memory=memory)
+        print(f"📏 Пакетный промпт: ~{tokens} токенов, {len(items)} сообщений в чате")
+        
+        try:
+            response = await self.llm.create(
+                messages=messages,
+                max_tokens=config.RESPONSE_MAX_TOKENS * len(items),
+                temperature=0.9,
+                response_format={"type": "json_object"},
             )
+            replies = self._parse_batch(response.choices[0].message.content, len(items))
+        except Exception as e:
+            print(f"⚠ Ошибка пакетного запроса: {e}")
+            return [None] * len(items)
+        
+        for reply in replies:
+            if reply:
+                self._remember_response(reply)
+        return replies
+    
+    @staticmethod
+    def _parse_batch(content: str, count: int) -> List[Optional[str]]:
+        """
+        Parse {"replies": [{"id": n, "reply": "..."}]} into a reply per message
+        
+        Args:
+            content: Model output
+            count: Messages in the batch
             
-            ai_response = response.choices[0].message.content.strip()
+        Returns:
+            Replies ordered by id (1..count), None for missing or invalid ones
+        """
+        replies: List[Optional[str]] = [None] * count
+        try:
+            # Tolerate text around the JSON object
+            start, end = content.index("{"), content.rindex("}") + 1
+            data = json.loads(content[start:end])
+        except ValueError:
+            return replies
+        
+        entries = data.get("replies") if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            return replies
+        
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                n = int(entry.get("id"))
+            except (TypeError, ValueError):
+                continue
+            reply = entry.get("reply")
+            if 1 <= n <= count and isinstance(reply, str) and reply.strip():
+                reply = reply.strip()
+                if len(reply) > config.MAX_RESPONSE_LENGTH:
+                    reply = reply[:config.MAX_RESPONSE_LENGTH] + "..."
+                replies[n - 1] = reply
+        return replies
+    
+    async def _get_cached(self, key: str, username: str, message: str) -> Optional[str]:
+        """
+        Look up cached answer or join an identical in-flight request
+        
+        Returns:
+            Answer, or None if the caller must generate it and call
+            response_cache.finish() (also when the joined request ended
+            without a shareable answer)
+        """
+        cached = self.response_cache.get(key, username)
+        if cached is None:
+            shared = self.response_cache.begin(key)
+            if shared is None:
+                return None
+            cached = await self.response_cache.wait(shared, username)
+            if cached is None:
+                return None
+        
+        # LLM skipped, but the message still belongs to user's history
+        self._record_message(username, message)
+        print(f"💾 Ответ из кэша: {key}")
+        return cached
+    
+    async def stream_response(self, username: str, message: str) -> AsyncIterator[str]:
+        """
+        Stream AI response sentence by sentence
+        
+        Args:
+            username: Username who sent the message
+            message: Message content
             
-            # Limit response length
-            if len(ai_response) > config.MAX_RESPONSE_LENGTH:
-                ai_response = ai_response[:config.MAX_RESPONSE_LENGTH] + "..."
+        Yields:
+            Complete sentences as soon as the model finishes them
+        """
+        key = self.response_cache.make_key(message)
+        if key:
+            try:
+                cached = await self._get_cached(key, username, message)
+            except Exception as e:
+                print(f"❌ Ошибка AI: {e}")
+                cached = "Ой, что-то пошло не так... 😅"
+            if cached is not None:
+                yield cached
+                return
+        
+        buffer = ""
+        sent = 0  # Characters already yielded
+        parts: List[str] = []
+        stream = None
+        completed = False
+        
+        try:
+            messages = self._prepare_messages(username, message)
             
-            # Add AI response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": ai_response
-            })
+            stream = await self.llm.create(
+                messages=messages,
+                max_tokens=config.RESPONSE_MAX_TOKENS,
+                temperature=0.9,
+                stream=True,
+            )
             
-            # Trim history if too long
-            if len(self.conversation_history) > self.max_history + 1:  # +1 for system prompt
-                self.conversation_history = [self.conversation_history[0]] + self.conversation_history[-(self.max_history):]
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                buffer += delta
+                
+                # Cut finished sentences off the front of the buffer
+                while True:
+                    match = SENTENCE_END.search(buffer, config.STREAM_MIN_SENTENCE_LENGTH)
+                    if not match:
+                        break
+                    sentence = buffer[:match.end()].strip()
+                    buffer = buffer[match.end():]
+                    
+                    # Limit response length
+                    if sent + len(sentence) > config.MAX_RESPONSE_LENGTH:
+                        buffer = sentence + " " + buffer
+                        break
+                    sent += len(sentence)
+                    parts.append(sentence)
+                    yield sentence
+                
+                if sent + len(buffer) > config.MAX_RESPONSE_LENGTH:
+                    break
             
-            return ai_response
+            tail = buffer.strip()
+            if tail:
+                if sent + len(tail) > config.MAX_RESPONSE_LENGTH:
+                    tail = tail[:max(0, config.MAX_RESPONSE_LENGTH - sent)] + "..."
+                parts.append(tail)
+                yield tail
             
+            if parts:
+                self._remember_response(" ".join(parts))
+            completed = True
+                
         except Exception as e:
             print(f"❌ Ошибка AI: {e}")
-            return "Ой, что-то пошло не так... 😅"
+            if not parts:
+                yield "Ой, что-то пошло не так... 😅"
+        finally:
+            if stream is not None:
+                # Length limit, error or consumer gone: release the connection, stop server-side generation
+                try:
+                    await stream.close()
+                except Exception:
+                    pass
+            if key:
+                # Only a fully streamed answer is cached; waiters fall back on anything else
+                answer = " ".join(parts) if completed else ""
+                self.response_cache.finish(key, username, answer or None)
+    
+    def _prepare_messages(self, username: str, message: str, record: bool = True) -> List[Dict[str, str]]:
+        """
+        Add user's message to history, return prompt messages
+        
+        The user's digest and their past messages most similar to this one
+        (vector index; newest lines while the index has none) are only put
+        into the prompt, conversation_history keeps the shared dialogue.
+        What fits into PROMPT_TOKEN_BUDGET is decided by PromptBuilder.
+        
+        Args:
+            username: Username who sent the message
+            message: Message content
+            record: False if the message is already in history (batch fallback)
+            
+        Returns:
+            Messages to send to the model
+        """
+        current = {
+            "role": "user",
+            "content": f"{username} спрашивает: {message}"
+        }
+        recent = [entry for entry in self.conversation_history[1:] if record or entry != current]
+        in_history = {entry["content"] for entry in recent}
+        memory = self._user_memory(username)
+        
+        digest = None
+        if memory.digest:
+            digest = {
+                "role": "system",
+                "content": f"Что ты помнишь о {username}: {memory.digest}"
+            }
+        
+        user_lines = []
+        past = self.db.search_user_messages(username, message) or memory.lines
+        for msg in past:
+            user_message = f"{username} спрашивает: {msg}"
+            if user_message not in in_history:
+                user_lines.append({
+                    "role": "user",
+                    "content": user_message
+                })
+        
+        if record:
+            # Add user message to history
+            self.conversation_history.append(current)
+            
+            # Save message to database
+            self._record_message(username, message)
+        
+        messages, tokens = self.prompt_builder.build(
+            self.conversation_history[0], current, user_lines, recent, memory=digest
+        )
+        print(f"📏 Промпт: ~{tokens} токенов, {len(messages)} сообщений (бюджет {self.prompt_builder.budget})")
+        return messages
+    
+    def _user_memory(self, username: str) -> UserMemory:
+        """
+        Get user's digest and ring buffer, load them from DB on first use
+        
+        Args:
+            username: Username
+            
+        Returns:
+            Memory with up to USER_HISTORY_SIZE messages newer than the digest
+        """
+        memory = self.user_history.get(username)
+        if memory is not None:
+            self.user_history.move_to_end(username)
+            return memory
+        
+        digest, digest_id = self.db.get_digest(username) or ("", 0)
+        memory = UserMemory(
+            lines=deque(
+                self.db.get_user_messages_text_only(username, config.USER_HISTORY_SIZE, after_id=digest_id),
+                maxlen=config.USER_HISTORY_SIZE,
+            ),
+            digest=digest,
+            digest_message_id=digest_id,
+        )
+        self.user_history[username] = memory
+        if len(self.user_history) > config.USER_HISTORY_USERS:
+            self.user_history.popitem(last=False)
+        return memory
+    
+    def _record_message(self, username: str, message: str):
+        """Save user's message to the database and the ring buffer"""
+        self._user_memory(username).lines.append(message)
+        self.active_users.add(username)
+        self.db.add_message(UserMessage(username=username, text=message))
+    
+    async def summarize_user(self, username: str, digest: str, lines: List[str]) -> str:
+        """
+        Fold new messages into the user's digest (cheap model, low max_tokens)
+        
+        Args:
+            username: Username
+            digest: Current digest ("" if none)
+            lines: New messages, oldest first
+            
+        Returns:
+            Updated digest
+        """
+        new_messages = "\n".join(f"- {line}" for line in lines)
+        response = await self.llm.create(
+            small=True,
+            messages=[
+                {"role": "system", "content": DIGEST_PROMPT},
+                {"role": "user", "content": (
+                    f"Зритель: {username}\n"
+                    f"Текущая заметка: {digest or 'нет'}\n"
+                    f"Новые сообщения:\n{new_messages}"
+                )},
+            ],
+            max_tokens=config.DIGEST_MAX_TOKENS,
+            temperature=0.3,
+        )
+        return response.choices[0].message.content.strip()[:config.DIGEST_MAX_LENGTH]
+    
+    def forget_user_lines(self, username: str):
+        """
+        Drop user's cached memory after the digest was updated
+        
+        The next prompt reloads the new digest and only the lines it
+        doesn't cover yet.
+        
+        Args:
+            username: Username
+        """
+        self.user_history.pop(username, None)
+    
+    def _remember_response(self, ai_response: str):
+        """Add AI response to history and trim it"""
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": ai_response
+        })
+        
+        # Trim history if too long
+        if len(self.conversation_history) > self.max_history + 1:  # +1 for system prompt
+            self.conversation_history = [self.conversation_history[0]] + self.conversation_history[-(self.max_history):]
     
     def reset_conversation(self):
         """Reset conversation history"""
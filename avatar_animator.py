@@ -23,6 +23,8 @@ class AvatarAnimator:
         
         # VRM controller
         self.vrm_controller: Optional[VRMController] = None
+        self.ready = asyncio.Event()  # WebSocket server is listening
+        self.viewer_url = "http://localhost:3000/web/vrm_viewer.html"
         
         # Check if VRM file exists
         self.vrm_path = Path("assets/ai_girl.vrm")
@@ -31,28 +33,37 @@ class AvatarAnimator:
         else:
             print(f"✓ VRM модель найдена: {self.vrm_path}")
     
-    async def start(self):
-        """Start avatar display and WebSocket server"""
+    async def start(self, open_browser: bool = True):
+        """
+        Start avatar display and WebSocket server
+        
+        Args:
+            open_browser: Open the viewer right away (False: caller runs
+                open_viewer() once the HTTP server is up)
+        """
         self.running = True
         
         # Start WebSocket server
         self.vrm_controller = VRMController(port=8765)
         await self.vrm_controller.start()
+        self.ready.set()
         
-        # Open browser with VRM viewer (using HTTP server)
-        viewer_url = "http://localhost:3000/web/vrm_viewer.html"
-        
-        print(f"🌐 Открытие VRM viewer: {viewer_url}")
-        print(f"⚠️ Если браузер не открылся, откройте вручную: {viewer_url}")
-        
-        webbrowser.open(viewer_url)
-        
-        print(f"✓ Аватар запущен: {self.window_name}")
+        if open_browser:
+            self.open_viewer()
         
         # Keep server running
         while self.running:
             await asyncio.sleep(0.1)
     
+    def open_viewer(self):
+        """Open browser with VRM viewer (using HTTP server)"""
+        print(f"🌐 Открытие VRM viewer: {self.viewer_url}")
+        print(f"⚠️ Если браузер не открылся, откройте вручную: {self.viewer_url}")
+        
+        webbrowser.open(self.viewer_url)
+        
+        print(f"✓ Аватар запущен: {self.window_name}")
+    
     async def stop(self):
         """Stop avatar display"""
         self.running = False
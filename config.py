@@ -15,10 +15,37 @@ TWITCH_TOKEN = os.getenv('TWITCH_TOKEN', '')
 TWITCH_CLIENT_ID = os.getenv('TWITCH_CLIENT_ID', '')
 TWITCH_CHANNEL = os.getenv('TWITCH_CHANNEL', '')
 TWITCH_BOT_NAME = os.getenv('TWITCH_BOT_NAME', '')
+MOCK_CHAT_PATH = os.getenv('MOCK_CHAT_PATH', 'chat.txt')  # no_bot mode: chat file (tailed), named pipe or '-' for stdin
 
 # AI Settings (supports Groq, DeepSeek, OpenAI, or any OpenAI-compatible API)
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')  # Can be Groq key (FREE!), DeepSeek key, or OpenAI key
 
+# LLM endpoints in priority order (any OpenAI-compatible API)
+LLM_ENDPOINTS = [
+    {
+        'name': 'groq',
+        'base_url': 'https://api.groq.com/openai/v1',
+        'api_key': OPENAI_API_KEY,
+        'model': 'llama-3.3-70b-versatile',
+        'small_model': 'llama-3.1-8b-instant',  # Background jobs (memory digests)
+    },
+]
+if os.getenv('LLM_FALLBACK_BASE_URL'):
+    LLM_ENDPOINTS.append({
+        'name': os.getenv('LLM_FALLBACK_NAME', 'fallback'),
+        'base_url': os.getenv('LLM_FALLBACK_BASE_URL'),
+        'api_key': os.getenv('LLM_FALLBACK_API_KEY', ''),
+        'model': os.getenv('LLM_FALLBACK_MODEL', 'llama-3.3-70b-versatile'),
+        'small_model': os.getenv('LLM_FALLBACK_SMALL_MODEL'),
+    })
+LLM_TIMEOUT = 15  # Seconds before a request to one endpoint fails
+LLM_HEDGE = True  # Duplicate a request to the next endpoint when the primary is slow
+LLM_HEDGE_DELAY = 2.0  # Seconds to wait before hedging until the primary has a p95
+LLM_HEDGE_MIN_DELAY = 0.3  # Never hedge earlier than this
+LLM_LATENCY_WINDOW = 50  # Latency samples kept per endpoint for p95
+LLM_CIRCUIT_FAILURES = 3  # Consecutive errors that take an endpoint out of rotation
+LLM_CIRCUIT_COOLDOWN = 30  # Seconds before a failed endpoint gets a trial request
+
 # Character Settings
 CHARACTER_NAME = os.getenv('CHARACTER_NAME', 'Лиза')
 CHARACTER_PERSONALITY = os.getenv(
@@ -28,6 +55,15 @@ CHARACTER_PERSONALITY = os.getenv(
 
 # Audio Settings
 AUDIO_OUTPUT_DIR = 'output/audio'
+AUDIO_CACHE_DIR = f'{AUDIO_OUTPUT_DIR}/clips'  # Rendered clips reused for repeated text
+AUDIO_CACHE_MAX_BYTES = 200 * 1024 * 1024  # Clip cache size budget
+DSP_ENGINE = 'numpy'  # Voice enhancement: 'numpy' (vectorized) or 'pydub' (reference, slow)
+AUDIO_WORKERS = 2  # Processes for voice enhancement (0 = thread in this process)
+AUDIO_POOL_MAX_PENDING = 4  # Max enhancement jobs submitted at once
+AUDIO_POOL_TIMEOUT = 20  # Seconds before an enhancement job is abandoned
+AUDIO_CHUNK_SIZE = 16 * 1024  # Bytes per binary WebSocket frame when sending a clip
+LIPSYNC_FPS = 30  # Lip-sync envelope values per second, sent with each clip
+AUDIO_DEBUG_DUMP = False  # Also save every clip to AUDIO_OUTPUT_DIR (audio stays in memory otherwise)
 # Note: Using gTTS (Google TTS) for voice generation - free alternative
 # Voice customization is limited with gTTS, but it's free and works well
 
@@ -38,8 +74,82 @@ FRAME_RATE = 30
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720
 
+# Startup Settings
+STARTUP_TIMEOUT = 10  # Max seconds to wait for a component to report ready (ports, LLM warm-up)
+STARTUP_VIEWER_TIMEOUT = 15  # Max seconds to wait for the browser/OBS viewer to connect
+LLM_PREWARM = True  # Open LLM connections with a 1-token request during startup
+
 # Response Settings
 MAX_RESPONSE_LENGTH = 200  # Maximum characters for response
-MESSAGE_COOLDOWN = 5  # Seconds between responses
+MESSAGE_COOLDOWN = 0  # Min seconds between messages sent to the LLM (raise to save API quota)
+
+# Response Cache Settings
+RESPONSE_CACHE_SIZE = 256  # Max cached questions (LRU)
+RESPONSE_CACHE_TTL = 600  # Seconds a cached answer lives
+RESPONSE_CACHE_VARIANTS = 3  # Different answers kept per question
+RESPONSE_CACHE_MAX_KEY_LENGTH = 40  # Longer messages are too specific to cache
+
+# Pipeline Settings
+PIPELINE_QUEUE_SIZE = 2  # Max jobs waiting in front of each stage (LLM, TTS, playback)
+PIPELINE_MAX_IN_FLIGHT = 3  # Response slots: one playing + the rest being prepared (>= BATCH_MIN_MESSAGES, else no batching)
+PLAYBACK_PREFETCH = 0.5  # Seconds before a clip ends to send the next one to the browser
+
+# Streaming Settings
+STREAM_RESPONSES = True  # Speak each sentence as soon as the model finishes it
+STREAM_MIN_SENTENCE_LENGTH = 20  # Shorter sentences are merged with the next one
+
+# Database Settings
+DB_FLUSH_INTERVAL = 0.5  # Seconds between background writes of logged chat messages
+DB_FLUSH_ROWS = 50  # Write earlier once this many rows are queued
+DB_MAX_PENDING = 2000  # Queue limit, rows beyond it are dropped (never blocks the event loop)
+DB_CHECKPOINT_INTERVAL = 10.0  # Seconds between WAL checkpoints by the writer thread (SQLite's own runs inside COMMIT)
+DB_RETENTION_DAYS = 30  # Messages older than this move to data/archive (gzip JSONL per month)
+DB_MAINTENANCE_INTERVAL = 300  # Seconds between archive/vacuum passes (only while chat is idle)
+DB_ARCHIVE_BATCH = 5000  # Max rows per table moved in one step
+DB_VACUUM_PAGES = 500  # Max free pages returned to the filesystem in one step
+
+# Prompt Settings
+PROMPT_TOKEN_BUDGET = 1200  # Max estimated prompt tokens (system + chat context)
+RESPONSE_MAX_TOKENS = 150  # Max tokens the model may generate per answer
+
+# Memory Settings
+USER_HISTORY_SIZE = 5  # Recent messages of the chatter added to the prompt
+USER_HISTORY_USERS = 1000  # Chatters kept in memory, least recently active are dropped
+MEMORY_INDEX_ENABLED = True  # Pick the chatter's past messages most similar to the current one (vector index)
+MEMORY_TOP_K = 4  # Relevant past messages added to the prompt
+MEMORY_MIN_SIMILARITY = 0.3  # Cosine similarity a past message needs to be added
+MEMORY_SEARCH_MAX_ROWS = 20000  # Only the chatter's newest messages are searched
+DIGEST_ENABLED = True  # Summarize regulars' history into short notes in idle time
+DIGEST_INTERVAL = 60  # Seconds between digest passes
+DIGEST_MIN_NEW_MESSAGES = 5  # New messages needed before a chatter's note is updated
+DIGEST_BATCH_MESSAGES = 50  # Max messages folded into a note per LLM call
+DIGEST_MAX_TOKENS = 120  # Max tokens per note
+DIGEST_MAX_LENGTH = 400  # Max characters per note
+
+# Batch Settings
+BATCH_ENABLED = True  # Answer several buffered messages with one LLM request when chat is busy
+BATCH_MIN_MESSAGES = 3  # Buffered messages and free response slots needed to start batching
+BATCH_MAX_MESSAGES = 3  # Max messages per batched request (also capped by free slots, see PIPELINE_MAX_IN_FLIGHT)
+
+# Scheduler Settings
+SCHEDULER_CAPACITY = 50  # Max buffered chat messages
+SCHEDULER_MAX_AGE = 30  # Seconds before a buffered message expires
+SCHEDULER_WEIGHT_MENTION = 3.0  # Message mentions CHARACTER_NAME
+SCHEDULER_WEIGHT_QUESTION = 2.0  # Message contains '?'
+SCHEDULER_WEIGHT_FIRST_TIME = 1.5  # User has no stored messages
+SCHEDULER_WEIGHT_AGE = 0.1  # Score lost per second of waiting
 
-BANNED_WORDS_FILE = PROJECT_ROOT / 'res/banned_words.txt'
\ No newline at end of file
+BANNED_WORDS_FILE = PROJECT_ROOT / 'res/banned_words.txt'
+FILTER_MAX_LENGTH = 250  # Longer messages are ignored
+FILTER_CAPS_RATIO = 0.7  # Messages with more uppercase letters than this share are ignored
+FILTER_CAPS_MIN_LENGTH = 10  # Shorter messages are never treated as CAPS
+FILTER_MAX_REPEAT = 6  # Same character this many times in a row is spam
+IGNORE_USERS = [name.strip() for name in os.getenv('IGNORE_USERS', '').split(',') if name.strip()]  # Bots etc.
+RATE_LIMIT_ENABLED = True  # Per-chatter token bucket in front of the scheduler
+RATE_LIMIT_PER_MINUTE = 6  # Messages per minute a chatter can get considered for an answer
+RATE_LIMIT_BURST = 3  # Messages a chatter can send at once before the limit applies
+RATE_LIMIT_USERS = 5000  # Chatters tracked (least recently active are forgotten)
+DUPLICATE_ENABLED = True  # Collapse copypasta variants into the first message
+DUPLICATE_WINDOW = 60  # Seconds a message is remembered (each variant extends it)
+DUPLICATE_THRESHOLD = 0.7  # Estimated similarity (0..1) that counts as the same message
+DUPLICATE_MIN_LENGTH = 12  # Shorter messages are never treated as duplicates
@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+def month_of(timestamp_ms: int) -> str:
+    """Месяц метки времени (локальное время) в виде 'YYYY-MM'"""
+    return datetime.fromtimestamp(timestamp_ms / 1000).strftime('%Y-%m')
+
+
+class MessageArchive:
+    """
+    Архив старых строк: по файлу на таблицу и месяц
+
+    <directory>/<table>-YYYY-MM.jsonl.gz, одна JSON-строка на запись (с id
+    и timestamp в мс). Каждая дозапись - отдельный gzip-member, gzip читает
+    их подряд как один поток. Если процесс упал между записью архива и
+    удалением строк из БД, строки попадут в архив повторно - чтение
+    отбрасывает дубликаты по id.
+    """
+
+    SUFFIX = '.jsonl.gz'
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Каталог архива (создается при первой записи)
+        """
+        self.directory = Path(directory)
+
+    def _path(self, table: str, month: str) -> Path:
+        return self.directory / f"{table}-{month}{self.SUFFIX}"
+
+    def months(self, table: str) -> List[str]:
+        """Месяцы, за которые есть архив таблицы, по возрастанию"""
+        prefix = f"{table}-"
+        if not self.directory.exists():
+            return []
+        return sorted(
+            path.name[len(prefix):-len(self.SUFFIX)]
+            for path in self.directory.glob(f"{prefix}*{self.SUFFIX}")
+        )
+
+    def append(self, table: str, rows: List[Dict]) -> int:
+        """
+        Дописать строки в файлы их месяцев и сбросить на диск (fsync)
+
+        Args:
+            table: Имя таблицы
+            rows: Строки с ключом 'timestamp' (мс), по возрастанию id
+
+        Returns:
+            Количество записанных строк
+        """
+        if not rows:
+            return 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for month, group in groupby(rows, key=lambda row: month_of(row['timestamp'])):
+            data = ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in group)
+            with open(self._path(table, month), 'ab') as f:
+                size = f.tell()
+                try:
+                    f.write(gzip.compress(data.encode('utf-8')))
+                    f.flush()
+                    os.fsync(f.fileno())
+                except OSError:
+                    # Не оставлять недописанный member: после него файл не читается
+                    f.truncate(size)
+                    raise
+        return len(rows)
+
+    def read(
+        self,
+        table: str,
+        username: str = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """
+        Прочитать архив таблицы; открываются только файлы нужных месяцев
+
+        Args:
+            table: Имя таблицы
+            username: Только строки этого пользователя
+            since_ms: Не раньше этой метки (мс, включительно)
+            until_ms: Раньше этой метки (мс, не включительно)
+
+        Yields:
+            Строки по возрастанию месяца и id
+        """
+        first = month_of(since_ms) if since_ms is not None else None
+        last = month_of(until_ms) if until_ms is not None else None
+
+        for month in self.months(table):
+            if (first and month < first) or (last and month > last):
+                continue
+
+            seen = set()
+            rows = []
+            try:
+                with gzip.open(self._path(table, month), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        row = json.loads(line)
+                        if row['id'] in seen:
+                            continue
+                        seen.add(row['id'])
+                        if username is not None and row['username'] != username:
+                            continue
+                        if since_ms is not None and row['timestamp'] < since_ms:
+                            continue
+                        if until_ms is not None and row['timestamp'] >= until_ms:
+                            continue
+                        rows.append(row)
+            except (EOFError, OSError, ValueError) as e:
+                # Дозапись оборвана сбоем: строки из нее остались в БД и будут заархивированы снова
+                print(f"⚠ Архив {table} за {month} поврежден, прочитано {len(rows)} строк: {e}")
+            rows.sort(key=lambda row: row['id'])
+            yield from rows
@@ -2,9 +2,15 @@ from dataclasses import dataclass, asdict, field
 from datetime import datetime
 import sqlite3
 import json
-from typing import List, TypeVar, Generic
+import threading
+import time
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple, TypeVar, Generic
 from pathlib import Path
 from abc import ABC, abstractmethod
+import config
+from data.archive import MessageArchive
 
 T = TypeVar('T')
 
@@ -32,74 +38,639 @@ class UserMessageMapper(DataMapper[UserMessage]):
         return {
             'username': message.username,
             'text': message.text,
-            'timestamp': message.timestamp.isoformat(),
+            'timestamp': int(message.timestamp.timestamp() * 1000),  # epoch, мс
         }
     
     def from_db(self, data: dict) -> UserMessage:
         return UserMessage(
             username=data['username'],
             text=data['text'],
-            timestamp=datetime.fromisoformat(data['timestamp']),
+            timestamp=datetime.fromtimestamp(data['timestamp'] / 1000),
         )
 
 class AppDb:
-    def __init__(self, db_path: str = None):
+    """
+    Хранилище сообщений чата (SQLite, одно долгоживущее соединение в режиме WAL)
+    
+    Запись отложенная: add_message() только кладет строку в ограниченную
+    очередь, фоновый поток пишет накопленное одной транзакцией (executemany)
+    раз в flush_interval секунд или по batch_size строк через отдельное
+    соединение - WAL позволяет читать во время записи, поэтому чтение из
+    event loop не ждет транзакцию. Переполненная очередь отбрасывает строки
+    (dropped_rows), а не блокирует вызывающего. Чтение учитывает еще не
+    записанные строки.
+    
+    В БД хранится только горячее окно: archive_before() переносит старые
+    строки в помесячный архив (data/archive), vacuum() возвращает
+    освободившиеся страницы, чтобы файл БД оставался маленьким.
+    """
+    
+    SCHEMA_VERSION = 4
+    
+    # Архивируемые таблицы и их колонки (кроме id и timestamp)
+    ARCHIVE_TABLES = {
+        'user_messages': ('username', 'message_text'),
+        'skipped_messages': ('username', 'message_text', 'reason'),
+    }
+    
+    # Горячие запросы: постоянные строки, sqlite3 кэширует подготовленные выражения
+    SQL_INSERT_MESSAGE = 'INSERT INTO user_messages (username, message_text, timestamp) VALUES (?, ?, ?)'
+    SQL_INSERT_SKIPPED = 'INSERT INTO skipped_messages (username, message_text, reason, timestamp) VALUES (?, ?, ?, ?)'
+    SQL_USER_MESSAGES = 'SELECT username, message_text, timestamp FROM user_messages WHERE username = ? ORDER BY timestamp'
+    SQL_LAST_USER_MESSAGES = (
+        'SELECT username, message_text, timestamp FROM user_messages WHERE username = ? AND id > ? '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    )
+    SQL_MESSAGES_AFTER = 'SELECT id, message_text FROM user_messages WHERE username = ? AND id > ? ORDER BY id LIMIT ?'
+    SQL_INDEX_ROWS = 'SELECT id, username, message_text FROM user_messages WHERE id > ? ORDER BY id LIMIT ?'
+    SQL_HAS_USER = 'SELECT 1 FROM user_messages WHERE username = ? LIMIT 1'
+    SQL_DIGEST = 'SELECT digest, last_message_id FROM user_digests WHERE username = ?'
+    SQL_SAVE_DIGEST = (
+        'INSERT OR REPLACE INTO user_digests (username, digest, last_message_id, updated_at) VALUES (?, ?, ?, ?)'
+    )
+    
+    def __init__(
+        self,
+        db_path: str = None,
+        flush_interval: float = config.DB_FLUSH_INTERVAL,
+        batch_size: int = config.DB_FLUSH_ROWS,
+        max_pending: int = config.DB_MAX_PENDING,
+        checkpoint_interval: float = config.DB_CHECKPOINT_INTERVAL,
+        index: bool = config.MEMORY_INDEX_ENABLED,
+    ):
         if db_path is None:
             db_path = Path(__file__).parent.parent / 'data' / 'app_db.db'
         
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()  # Читающее соединение (и векторный индекс)
+        self._write_lock = threading.RLock()  # Пишущее соединение
+        self.conn = self._connect()
         self._init_db()
         self.message_mapper = UserMessageMapper()
+        self.archive = MessageArchive(self.db_path.parent / 'archive')
         
+        # Векторный индекс сообщений; открывается и догоняет БД в фоновом потоке
+        self.index_enabled = index
+        self.index = None
+        
+        # Очередь отложенной записи: (sql, параметры)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: List[Tuple[str, tuple]] = []
+        # Незаписанные сообщения (очередь + пачка, которая пишется сейчас) по пользователям
+        self._unflushed: Dict[str, List[tuple]] = {}
+        self._pending_cond = threading.Condition()
+        self._committing = False  # Идет COMMIT пачки
+        self._commits = 0  # Завершенные COMMIT: читатель по нему видит, что пачка ушла в БД
+        self._stopping = False
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+        self._write_conn = self._connect()
+        # Checkpoint делает поток записи вне COMMIT (автоматический - внутри COMMIT, с fsync)
+        self._write_conn.execute('PRAGMA wal_autocheckpoint=0')
+        self.checkpoint_interval = checkpoint_interval
+        self._next_checkpoint = time.monotonic() + checkpoint_interval
+        self._checkpointed_commits = 0
+        self._writer = threading.Thread(target=self._writer_loop, name='AppDbWriter', daemon=True)
+        self._writer.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение и настроить pragma"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # доступ защищен self._lock / self._write_lock
+            cached_statements=128,
+            isolation_level=None,  # транзакции управляются явно
+        )
+        # До WAL: новая БД создается сразу с incremental vacuum, существующая переводится VACUUM-ом
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # в WAL безопасно, fsync только на checkpoint
+        conn.execute('PRAGMA cache_size=-16000')  # ~16 MB
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_messages (
-                    username TEXT,
-                    message_text TEXT,
-                    timestamp TEXT
+        with self._lock:
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= self.SCHEMA_VERSION:
+                return
+            
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                if version < 1:
+                    self._migrate_v1()
+                if version < 2:
+                    # v2: сообщения, на которые не ответили (фильтр, переполнение буфера, ...)
+                    self.conn.execute('''
+                        CREATE TABLE IF NOT EXISTS skipped_messages (
+                            id INTEGER PRIMARY KEY,
+                            username TEXT NOT NULL,
+                            message_text TEXT NOT NULL,
+                            reason TEXT NOT NULL,
+                            timestamp TEXT NOT NULL
+                        )
+                    ''')
+                if version < 3:
+                    # v3: краткие заметки о зрителях; last_message_id - последнее учтенное сообщение
+                    self.conn.execute('''
+                        CREATE TABLE IF NOT EXISTS user_digests (
+                            username TEXT PRIMARY KEY,
+                            digest TEXT NOT NULL,
+                            last_message_id INTEGER NOT NULL,
+                            updated_at TEXT NOT NULL
+                        )
+                    ''')
+                if version < 4:
+                    self._migrate_v4()
+                self.conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+    
+    def _migrate_v1(self):
+        """v1: первичный ключ, NOT NULL и индекс (username, timestamp)"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_messages'"
+        ).fetchone()
+        
+        self.conn.execute('''
+            CREATE TABLE user_messages_new (
+                id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL,
+                message_text TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        ''')
+        if exists:
+            # Миграция v0: таблица без ключа и индексов
+            self.conn.execute('''
+                INSERT INTO user_messages_new (username, message_text, timestamp)
+                SELECT username, COALESCE(message_text, ''), COALESCE(timestamp, '') FROM user_messages
+                WHERE username IS NOT NULL
+                ORDER BY timestamp
+            ''')
+            self.conn.execute('DROP TABLE user_messages')
+        self.conn.execute('ALTER TABLE user_messages_new RENAME TO user_messages')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_user_messages_user_ts ON user_messages (username, timestamp)'
+        )
+    
+    def _migrate_v4(self):
+        """v4: timestamp - INTEGER (epoch, мс), id AUTOINCREMENT (не переиспользуются после архивации)"""
+        for table, columns in self.ARCHIVE_TABLES.items():
+            column_defs = ''.join(f'{column} TEXT NOT NULL, ' for column in columns)
+            names = ', '.join(columns)
+            self.conn.execute(f'''
+                CREATE TABLE {table}_new (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    {column_defs}
+                    timestamp INTEGER NOT NULL
                 )
-            ''')  # ✅ Убрал лишнюю запятую
+            ''')
+            # Старые метки - локальное время в ISO без зоны; нечитаемые становятся 0
+            self.conn.execute(f'''
+                INSERT INTO {table}_new (id, {names}, timestamp)
+                SELECT id, {names},
+                    COALESCE(CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER), 0)
+                FROM {table}
+            ''')
+            self.conn.execute(f'DROP TABLE {table}')
+            self.conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_user_messages_user_ts ON user_messages (username, timestamp)'
+        )
     
     def add_message(self, message: UserMessage):
-        """Добавить сообщение в отдельную таблицу"""
-        with sqlite3.connect(self.db_path) as conn:
-            data = self.message_mapper.to_db(message)
-            conn.execute('''
-                INSERT INTO user_messages (username, message_text, timestamp)
-                VALUES (?, ?, ?)
-            ''', (data['username'], data['text'], data['timestamp']))
-    
-    def get_user_messages(self, username: str) -> List[UserMessage]:
-        """Получить все сообщения пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                'SELECT username, message_text, timestamp FROM user_messages WHERE username = ? ORDER BY timestamp',  # ✅ Убрал лишнюю запятую
-                (username,)
-            )
-            results = cursor.fetchall()
+        """Добавить сообщение в очередь записи"""
+        data = self.message_mapper.to_db(message)
+        self._enqueue(self.SQL_INSERT_MESSAGE, (data['username'], data['text'], data['timestamp']))
+    
+    def add_skipped_message(self, message: UserMessage, reason: str):
+        """Сохранить сообщение, на которое не ответили, и причину пропуска"""
+        data = self.message_mapper.to_db(message)
+        self._enqueue(self.SQL_INSERT_SKIPPED, (data['username'], data['text'], reason, data['timestamp']))
+    
+    def _enqueue(self, sql: str, params: tuple):
+        """Положить строку в очередь; переполненная очередь строку отбрасывает (не ждать в event loop)"""
+        with self._pending_cond:
+            if len(self._pending) >= self.max_pending:
+                if not self.dropped_rows:
+                    print(f"⚠ Очередь записи в БД переполнена ({self.max_pending}), строки отбрасываются")
+                self.dropped_rows += 1
+                self._pending_cond.notify_all()
+                return
+            self._pending.append((sql, params))
+            if sql == self.SQL_INSERT_MESSAGE:
+                self._unflushed.setdefault(params[0], []).append(params)
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._pending_cond.notify_all()
+    
+    def _writer_loop(self):
+        """Фоновый поток: пишет очередь по batch_size строк или раз в flush_interval"""
+        if self.index_enabled:
+            self._open_index()
+        while True:
+            with self._pending_cond:
+                while not self._pending and not self._stopping:
+                    self._pending_cond.wait()
+                if self._stopping:
+                    return
+                
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending_cond.wait(remaining)
             
-            messages = []
-            for row in results:
-                data = {
-                    'username': row[0],
-                    'text': row[1],
-                    'timestamp': row[2],  # ✅ Исправил индекс с 3 на 2
-                }
-                messages.append(self.message_mapper.from_db(data))
+            self.flush()
+            self._sync_index()
+            self._checkpoint_if_due()
+    
+    def _open_index(self):
+        """Открыть векторный индекс (numpy грузится здесь, а не при старте) и догнать БД"""
+        from data.message_index import MessageIndex
+        try:
+            index = MessageIndex(self.db_path.with_suffix('.msgvec'))
+        except (OSError, ValueError) as e:
+            print(f"⚠ Индекс сообщений недоступен: {e}")
+            return
+        with self._lock:
+            self.index = index
+        self._sync_index()
+    
+    def _sync_index(self, chunk: int = 500):
+        """Добавить в индекс записанные сообщения, которых в нем еще нет"""
+        while self.index is not None:
+            with self._write_lock:
+                if self._write_conn is None:
+                    return
+                rows = self._write_conn.execute(self.SQL_INDEX_ROWS, (self.index.last_id, chunk)).fetchall()
+            if rows:
+                # Векторы считаются до lock: поиск и чтение истории их не ждут
+                vectors = self.index.encode([row[2] for row in rows])
+                with self._lock:
+                    self.index.add(rows, vectors)
+            if len(rows) < chunk:
+                with self._lock:
+                    if self.index is not None:
+                        self.index.save_if_due()
+                return
+            # Первичное построение по большой БД: не задерживать запись чата
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+    
+    def _checkpoint_if_due(self):
+        """Перенести WAL в БД (PASSIVE: читателей не ждет), не чаще раза в checkpoint_interval"""
+        if time.monotonic() < self._next_checkpoint or self._commits == self._checkpointed_commits:
+            return
+        self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+        self._checkpointed_commits = self._commits
+        with self._write_lock:
+            if self._write_conn is None:
+                return
+            try:
+                self._write_conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            except sqlite3.Error as e:
+                print(f"⚠ Checkpoint WAL не удался: {e}")
+    
+    def flush(self) -> int:
+        """
+        Записать очередь одной транзакцией (через пишущее соединение, читатели не ждут)
+        
+        Returns:
+            Количество записанных строк
+        """
+        with self._write_lock:
+            with self._pending_cond:
+                batch, self._pending = self._pending, []
+                self._pending_cond.notify_all()
+            if not batch or self._write_conn is None:
+                return 0
             
-            return messages  # ✅ Закрыл метод правильно
+            written = 0
+            try:
+                self._write_conn.execute('BEGIN')
+                for sql, rows in groupby(batch, key=itemgetter(0)):
+                    self._write_conn.executemany(sql, [params for _, params in rows])
+                with self._pending_cond:
+                    self._committing = True
+                self._write_conn.execute('COMMIT')
+                self.flushed_rows += len(batch)
+                written = len(batch)
+            except sqlite3.Error as e:
+                if self._write_conn.in_transaction:
+                    self._write_conn.execute('ROLLBACK')
+                print(f"⚠ Не удалось записать {len(batch)} сообщений в БД: {e}")
+            finally:
+                with self._pending_cond:
+                    self._committing = False
+                    self._commits += 1
+                    self._drop_unflushed(batch)
+                    self._pending_cond.notify_all()
+            return written
+    
+    def _drop_unflushed(self, batch: List[Tuple[str, tuple]]):
+        """Убрать пачку из _unflushed (у каждого пользователя она в начале списка)"""
+        counts: Dict[str, int] = {}
+        for sql, params in batch:
+            if sql == self.SQL_INSERT_MESSAGE:
+                counts[params[0]] = counts.get(params[0], 0) + 1
+        for username, count in counts.items():
+            rows = self._unflushed[username]
+            del rows[:count]
+            if not rows:
+                del self._unflushed[username]
+    
+    def _read(self, sql: str, params: tuple, username: str = None) -> Tuple[List[tuple], List[tuple]]:
+        """
+        Запрос к БД и еще не записанные сообщения, согласованные между собой
+        
+        Если во время запроса пачка из очереди ушла в БД, запрос повторяется:
+        строка попадает в результат ровно один раз.
+        
+        Returns:
+            (строки запроса, незаписанные сообщения (username, text, timestamp))
+        """
+        while True:
+            with self._pending_cond:
+                # COMMIT короткий: ждем только его, а не всю транзакцию
+                self._pending_cond.wait_for(lambda: not self._committing)
+                commits = self._commits
+                if username is None:
+                    unflushed = [row for rows in self._unflushed.values() for row in rows]
+                else:
+                    unflushed = list(self._unflushed.get(username, ()))
+            with self._lock:
+                rows = self.conn.execute(sql, params).fetchall()
+            with self._pending_cond:
+                if not self._committing and self._commits == commits:
+                    break
+        return rows, unflushed
+    
+    def _to_messages(self, rows: List[tuple]) -> List[UserMessage]:
+        messages = []
+        for row in rows:
+            data = {
+                'username': row[0],
+                'text': row[1],
+                'timestamp': row[2],
+            }
+            messages.append(self.message_mapper.from_db(data))
+        return messages
+    
+    def get_user_messages(self, username: str, include_archive: bool = False) -> List[UserMessage]:
+        """Получить все сообщения пользователя (с include_archive - и архивные)"""
+        archived = self.get_archived_messages(username) if include_archive else []
+        results, unflushed = self._read(self.SQL_USER_MESSAGES, (username,), username)
+        return archived + self._to_messages(results + unflushed)
+    
+    def search_user_messages(
+        self,
+        username: str,
+        text: str,
+        k: int = config.MEMORY_TOP_K,
+        min_similarity: float = config.MEMORY_MIN_SIMILARITY,
+        max_rows: int = config.MEMORY_SEARCH_MAX_ROWS,
+    ) -> List[str]:
+        """
+        Найти записанные сообщения пользователя, близкие к text
+        
+        Args:
+            username: Пользователь
+            text: Текущее сообщение (само оно и его повторы не возвращаются)
+            k: Сколько сообщений вернуть
+            min_similarity: Минимальная косинусная близость
+            max_rows: Искать среди последних max_rows сообщений пользователя
+        
+        Returns:
+            Тексты в хронологическом порядке (пусто, пока индекс не готов)
+        """
+        index = self.index
+        if index is None:
+            return []
+        # Вектор запроса считается до lock: под ним только поиск по матрице
+        query = index.embed_query(text)
+        with self._lock:
+            if self.index is not index:
+                return []
+            # С запасом: совпадения с текущим сообщением и повторы отбрасываются
+            hits = [
+                message_id for message_id, score in index.search(username, text, k * 2, max_rows, query)
+                if score >= min_similarity
+            ]
+        if not hits:
+            return []
+        with self._lock:
+            rows = self.conn.execute(
+                f'SELECT id, username, message_text FROM user_messages WHERE id IN ({",".join("?" * len(hits))})',
+                hits,
+            ).fetchall()
+        
+        texts = {message_id: message_text for message_id, user, message_text in rows if user == username}
+        chosen = []
+        seen = {text.strip().lower()}
+        for message_id in hits:
+            message_text = texts.get(message_id)
+            if message_text is None or message_text.strip().lower() in seen:
+                continue
+            seen.add(message_text.strip().lower())
+            chosen.append(message_id)
+            if len(chosen) == k:
+                break
+        return [texts[message_id] for message_id in sorted(chosen)]
+    
+    def get_archived_messages(
+        self,
+        username: str = None,
+        since: datetime = None,
+        until: datetime = None,
+    ) -> List[UserMessage]:
+        """
+        Получить сообщения из архива (читаются только файлы нужных месяцев)
+        
+        Args:
+            username: Только сообщения этого пользователя
+            since: Не раньше этого времени
+            until: Раньше этого времени
+        
+        Returns:
+            Сообщения в порядке записи
+        """
+        rows = self.archive.read(
+            'user_messages',
+            username=username,
+            since_ms=int(since.timestamp() * 1000) if since else None,
+            until_ms=int(until.timestamp() * 1000) if until else None,
+        )
+        return self._to_messages([(row['username'], row['message_text'], row['timestamp']) for row in rows])
+    
+    def get_last_user_messages(self, username: str, limit: int = 10, after_id: int = 0) -> List[UserMessage]:
+        """Получить последние limit сообщений пользователя с id > after_id (по индексу, в хронологическом порядке)"""
+        return self._to_messages(self._last_rows(username, limit, after_id))
+    
+    def _last_rows(self, username: str, limit: int, after_id: int = 0) -> List[tuple]:
+        results, unflushed = self._read(self.SQL_LAST_USER_MESSAGES, (username, after_id, limit), username)
+        results.reverse()
+        results += unflushed
+        return results[-limit:] if limit > 0 else []
 
     # Дополнительные полезные методы:
     
-    def get_user_messages_text_only(self, username: str, limit: int = 10) -> List[str]:
-        """Получить только тексты сообщений пользователя"""
-        messages = self.get_user_messages(username)
-        return [msg.text for msg in messages[-limit:]]
+    def get_user_messages_text_only(self, username: str, limit: int = 10, after_id: int = 0) -> List[str]:
+        """Получить только тексты последних сообщений пользователя"""
+        return [row[1] for row in self._last_rows(username, limit, after_id)]
+    
+    def get_messages_after(self, username: str, after_id: int, limit: int = 50) -> List[Tuple[int, str]]:
+        """Записанные сообщения пользователя с id > after_id: [(id, текст)], старые первыми"""
+        with self._lock:
+            return self.conn.execute(self.SQL_MESSAGES_AFTER, (username, after_id, limit)).fetchall()
+    
+    def get_digest(self, username: str) -> Optional[Tuple[str, int]]:
+        """Получить заметку о пользователе: (текст, id последнего учтенного сообщения)"""
+        with self._lock:
+            return self.conn.execute(self.SQL_DIGEST, (username,)).fetchone()
+    
+    def save_digest(self, username: str, digest: str, last_message_id: int):
+        """Сохранить заметку о пользователе (через пишущее соединение, читатели не ждут)"""
+        with self._write_lock:
+            if self._write_conn is None:
+                return
+            self._write_conn.execute(
+                self.SQL_SAVE_DIGEST,
+                (username, digest, last_message_id, datetime.now().isoformat())
+            )
+    
+    def has_user(self, username: str) -> bool:
+        """Проверить, есть ли у пользователя сообщения"""
+        rows, unflushed = self._read(self.SQL_HAS_USER, (username,), username)
+        return bool(rows or unflushed)
     
     def get_all_users(self) -> List[str]:
         """Получить список всех пользователей"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute('SELECT DISTINCT username FROM user_messages')
-            return [row[0] for row in cursor.fetchall()]
\ No newline at end of file
+        rows, unflushed = self._read('SELECT DISTINCT username FROM user_messages', ())
+        users = [row[0] for row in rows]
+        known = set(users)
+        for row in unflushed:
+            if row[0] not in known:
+                known.add(row[0])
+                users.append(row[0])
+        return users
+    
+    def archive_before(self, cutoff_ms: int, limit: int = config.DB_ARCHIVE_BATCH) -> int:
+        """
+        Перенести в архив до limit самых старых строк с timestamp < cutoff_ms
+        
+        Берется префикс таблицы по id (без индекса по времени, стоимость
+        ограничена limit). Архив пишется и сбрасывается на диск до удаления
+        строк, запись чата в это время не блокируется.
+        
+        Args:
+            cutoff_ms: Граница горячего окна (epoch, мс)
+            limit: Максимум строк на таблицу за вызов
+        
+        Returns:
+            Количество перенесенных строк
+        """
+        moved = 0
+        for table, columns in self.ARCHIVE_TABLES.items():
+            names = ('id',) + columns + ('timestamp',)
+            with self._write_lock:
+                rows = self._write_conn.execute(
+                    f'SELECT {", ".join(names)} FROM {table} ORDER BY id LIMIT ?', (limit,)
+                ).fetchall()
+            
+            old = []
+            for row in rows:
+                if row[-1] >= cutoff_ms:
+                    break
+                old.append(dict(zip(names, row)))
+            if not old:
+                continue
+            
+            self.archive.append(table, old)
+            with self._write_lock:
+                self._write_conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._write_conn.execute(
+                        f'DELETE FROM {table} WHERE id <= ? AND timestamp < ?', (old[-1]['id'], cutoff_ms)
+                    )
+                    self._write_conn.execute('COMMIT')
+                except sqlite3.Error:
+                    self._write_conn.execute('ROLLBACK')
+                    raise
+            if table == 'user_messages':
+                with self._lock:
+                    if self.index is not None:
+                        self.index.drop_until(old[-1]['id'])
+            moved += len(old)
+        return moved
+    
+    def vacuum(self, pages: int = config.DB_VACUUM_PAGES) -> int:
+        """
+        Вернуть до pages свободных страниц файловой системе (PRAGMA incremental_vacuum)
+        
+        Returns:
+            Количество освобожденных страниц
+        """
+        with self._write_lock:
+            free = self._write_conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                return 0
+            # Pragma освобождает по странице на шаг; execute() делает один шаг, executescript() - все
+            self._write_conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+            freed = free - self._write_conn.execute('PRAGMA freelist_count').fetchone()[0]
+            self._write_conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            return freed
+    
+    def incremental_vacuum_enabled(self) -> bool:
+        """Включен ли auto_vacuum=INCREMENTAL в файле БД (без него vacuum() ничего не освобождает)"""
+        # Открытые соединения помнят режим со своего подключения: спрашиваем новое
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        finally:
+            conn.close()
+    
+    def enable_incremental_vacuum(self):
+        """
+        Перевести существующую БД в auto_vacuum=INCREMENTAL
+        
+        Режим вступает в силу только после полного VACUUM (перезапись всего
+        файла), поэтому вызывается один раз из обслуживания в тихое время,
+        не при старте. Запись чата на это время ждет.
+        """
+        with self._write_lock:
+            self._write_conn.execute('VACUUM')
+    
+    def size_stats(self) -> dict:
+        """Размер БД: страницы, свободные страницы, байты"""
+        with self._lock:
+            pages = self.conn.execute('PRAGMA page_count').fetchone()[0]
+            free = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+        return {'pages': pages, 'free_pages': free, 'bytes': pages * page_size}
+    
+    def close(self):
+        """Дописать очередь и закрыть соединение"""
+        with self._pending_cond:
+            self._stopping = True
+            self._pending_cond.notify_all()
+        self._writer.join(timeout=5)
+        
+        with self._write_lock:
+            if self._write_conn:
+                self.flush()
+                self._write_conn.close()
+                self._write_conn = None
+        with self._lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+            if self.index is not None:
+                self.index.close()
+                self.index = None
@@ -0,0 +1,253 @@
+import json
+import os
+import re
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Размерность хешированных векторов
+DIM = 256
+
+# Векторы хранятся в int8: компонента нормированного вектора * 127.
+# Перевод int8 -> float32 на порядок быстрее, чем float16 -> float32
+QUANT_SCALE = 127
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    """
+    Вектор текста: хешированные слова и символьные 3-граммы (со знаком), нормированный
+
+    Модель не нужна, вектор стабилен между запусками (crc32). 3-граммы
+    делают близкими разные формы слова ("стрим", "стримы", "стримишь").
+
+    Args:
+        text: Текст сообщения
+        dim: Размерность
+
+    Returns:
+        float32 вектор длины dim (нулевой для текста без слов)
+    """
+    hashes = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        hashes.append(zlib.crc32(word.encode('utf-8')))
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            hashes.append(zlib.crc32(padded[i:i + 3].encode('utf-8')))
+    if not hashes:
+        return np.zeros(dim, np.float32)
+
+    hashes = np.array(hashes, dtype=np.uint32)
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+    vec = np.bincount(hashes % dim, weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def user_key(username: str) -> int:
+    return zlib.crc32(username.encode('utf-8'))
+
+
+class MessageIndex:
+    """
+    Векторный индекс сообщений в memory-mapped файле рядом с БД
+
+    <path>: строки (id сообщения, crc32 имени, int8 вектор) в порядке id,
+    <path>.json: счетчики. Для поиска по пользователю в памяти хранятся
+    номера его строк, так что сравнивается только его история, а не весь
+    файл. Строки, ушедшие в архив, отрезаются с начала (drop_until) и
+    физически удаляются при compact().
+
+    Счетчики сохраняются не чаще раза в SAVE_INTERVAL секунд и при
+    закрытии: после сбоя недостающие строки просто добавятся заново из БД.
+
+    Не потокобезопасен: AppDb вызывает его под своим lock (кроме encode()).
+    """
+
+    INITIAL_CAPACITY = 4096
+    SAVE_INTERVAL = 30.0
+
+    def __init__(self, path: str, dim: int = DIM):
+        """
+        Args:
+            path: Файл векторов
+            dim: Размерность
+        """
+        self.path = Path(path)
+        self.meta_path = self.path.with_name(self.path.name + '.json')
+        self.dim = dim
+        self.row_dtype = np.dtype([('id', '<i8'), ('user', '<u4'), ('vec', 'i1', (dim,))])
+
+        self.count = 0  # Записанные строки
+        self.start = 0  # Строки до start отрезаны (архив)
+        self.last_id = 0  # Последний проиндексированный id
+        self._rows = None
+        self._by_user: Dict[int, array] = {}
+        self._saved_at = time.monotonic()
+
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+
+        if meta and meta.get('dim') == self.dim and self.path.exists():
+            self.count = meta['count']
+            self.start = meta['start']
+            self.last_id = meta['last_id']
+            capacity = max(self.count, self.path.stat().st_size // self.row_dtype.itemsize)
+            self._map(max(capacity, self.INITIAL_CAPACITY))
+        else:
+            # Нет индекса или другая размерность: строится заново из БД
+            self._map(self.INITIAL_CAPACITY, reset=True)
+
+        users = np.asarray(self._rows['user'][self.start:self.count])
+        order = np.argsort(users, kind='stable')
+        if len(order):
+            keys, first = np.unique(users[order], return_index=True)
+            for key, group in zip(keys, np.split(order + self.start, first[1:])):
+                self._by_user[int(key)] = array('q', group.tolist())
+
+    def _map(self, capacity: int, reset: bool = False):
+        """(Пере)открыть файл на capacity строк"""
+        if self._rows is not None:
+            self._rows.flush()
+            self._rows = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w+b' if reset else 'r+b') as f:
+            f.truncate(capacity * self.row_dtype.itemsize)
+        self._rows = np.memmap(self.path, dtype=self.row_dtype, mode='r+', shape=(capacity,))
+
+    def __len__(self) -> int:
+        return self.count - self.start
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Квантованные векторы текстов; состояние не трогает, можно вызывать без lock"""
+        vectors = np.stack([embed(text, self.dim) for text in texts])
+        return np.rint(vectors * QUANT_SCALE).astype(np.int8)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Вектор запроса для search(); состояние не трогает, можно вызывать без lock"""
+        return embed(text, self.dim)
+
+    def add(self, rows: List[Tuple[int, str, str]], vectors: np.ndarray = None):
+        """
+        Добавить сообщения (id по возрастанию, больше last_id)
+
+        Args:
+            rows: [(id, username, текст)]
+            vectors: Готовые векторы из encode() (иначе считаются здесь)
+        """
+        keep = [i for i, row in enumerate(rows) if row[0] > self.last_id]
+        if not keep:
+            return
+        rows = [rows[i] for i in keep]
+        vectors = self.encode([row[2] for row in rows]) if vectors is None else vectors[keep]
+
+        needed = self.count + len(rows)
+        if needed > len(self._rows):
+            capacity = len(self._rows)
+            while capacity < needed:
+                capacity *= 2
+            self._map(capacity)
+
+        block = self._rows[self.count:needed]
+        block['id'] = [row[0] for row in rows]
+        block['user'] = [user_key(row[1]) for row in rows]
+        block['vec'] = vectors
+        for offset, (_, username, _) in enumerate(rows):
+            self._by_user.setdefault(user_key(username), array('q')).append(self.count + offset)
+
+        self.count = needed
+        self.last_id = rows[-1][0]
+
+    def search(
+        self,
+        username: str,
+        text: str,
+        k: int,
+        max_rows: int,
+        query: np.ndarray = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Самые похожие на text сообщения пользователя (косинусная близость)
+
+        Args:
+            username: Пользователь
+            text: Запрос
+            k: Сколько вернуть
+            max_rows: Сравнивать только с последними max_rows сообщениями пользователя
+            query: Готовый вектор из embed_query() (иначе считается здесь)
+
+        Returns:
+            [(id сообщения, близость)], самые близкие первыми
+        """
+        rows = self._by_user.get(user_key(username))
+        if not rows or k <= 0:
+            return []
+        rows = np.frombuffer(rows, dtype=np.int64)
+        rows = rows[np.searchsorted(rows, self.start):][-max_rows:]
+        if not len(rows):
+            return []
+
+        if query is None:
+            query = self.embed_query(text)
+        scores = (self._rows['vec'][rows].astype(np.float32) @ query) / QUANT_SCALE
+        if len(scores) > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(scores[top])[::-1]]
+        ids = self._rows['id'][rows[top]]
+        return [(int(message_id), float(scores[i])) for message_id, i in zip(ids, top)]
+
+    def drop_until(self, message_id: int):
+        """Отрезать строки с id <= message_id (ушли в архив)"""
+        ids = self._rows['id'][self.start:self.count]
+        self.start += int(np.searchsorted(ids, message_id, side='right'))
+        if self.start > len(self) and self.start >= self.INITIAL_CAPACITY:
+            self.compact()
+        else:
+            self._save()
+
+    def compact(self):
+        """Сдвинуть живые строки в начало файла"""
+        live = len(self)
+        self._rows[:live] = self._rows[self.start:self.count]
+        shift = self.start
+        self.count, self.start = live, 0
+        for key in list(self._by_user):
+            rows = np.frombuffer(self._by_user[key], dtype=np.int64)
+            rows = rows[rows >= shift] - shift
+            if len(rows):
+                self._by_user[key] = array('q', rows.tolist())
+            else:
+                del self._by_user[key]
+        self._save()
+
+    def save_if_due(self):
+        """Сохранить, если с прошлого сохранения прошло SAVE_INTERVAL секунд"""
+        if time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+            self._save()
+
+    def _save(self):
+        """Сбросить строки на диск, затем атомарно записать счетчики"""
+        self._rows.flush()
+        tmp_path = self.meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'count': self.count, 'start': self.start, 'last_id': self.last_id}, f)
+        os.replace(tmp_path, self.meta_path)
+        self._saved_at = time.monotonic()
+
+    def close(self):
+        if self._rows is not None:
+            self._save()
+            self._rows = None
@@ -0,0 +1,102 @@
+"""
+DB Maintenance - keeps the chat database small in idle time
+"""
+import asyncio
+import time
+from typing import Callable
+import config
+from data.db import AppDb
+
+
+class DbMaintenance:
+    """
+    Background job enforcing the SQLite hot window
+
+    Each pass moves rows older than retention_days into the monthly archive
+    (batch by batch) and then returns freed pages with incremental vacuum.
+    A database created before incremental vacuum is converted once with a
+    full VACUUM on the first idle pass. Steps run in the default executor
+    and only while is_idle() is true.
+    """
+
+    def __init__(
+        self,
+        db: AppDb,
+        is_idle: Callable[[], bool],
+        interval: float = config.DB_MAINTENANCE_INTERVAL,
+        retention_days: float = config.DB_RETENTION_DAYS,
+        archive_batch: int = config.DB_ARCHIVE_BATCH,
+        vacuum_pages: int = config.DB_VACUUM_PAGES,
+    ):
+        """
+        Initialize maintenance job
+
+        Args:
+            db: Chat database
+            is_idle: Returns True when no response is queued or being prepared
+            interval: Seconds between passes
+            retention_days: Hot window kept in SQLite
+            archive_batch: Max rows per table moved in one step
+            vacuum_pages: Max pages freed in one step
+        """
+        self.db = db
+        self.is_idle = is_idle
+        self.interval = interval
+        self.retention_days = retention_days
+        self.archive_batch = archive_batch
+        self.vacuum_pages = vacuum_pages
+
+        # Stats
+        self.archived = 0
+        self.vacuumed_pages = 0
+        self.failures = 0
+
+    async def run(self):
+        """Run maintenance passes forever"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.maintenance_pass()
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠ Ошибка обслуживания БД: {e}")
+
+    async def maintenance_pass(self):
+        """Archive rows outside the hot window, then vacuum; stops as soon as chat gets busy"""
+        loop = asyncio.get_running_loop()
+        cutoff_ms = int((time.time() - self.retention_days * 86400) * 1000)
+
+        archived = 0
+        while self.is_idle():
+            moved = await loop.run_in_executor(None, self.db.archive_before, cutoff_ms, self.archive_batch)
+            archived += moved
+            if moved < self.archive_batch:
+                break
+
+        enabled = await loop.run_in_executor(None, self.db.incremental_vacuum_enabled)
+        if self.is_idle() and not enabled:
+            # One-time full rewrite of an existing database, after archiving so it is smaller
+            print("🗄 БД: включаю incremental vacuum (однократный VACUUM)...")
+            started = time.monotonic()
+            await loop.run_in_executor(None, self.db.enable_incremental_vacuum)
+            print(f"🗄 БД: VACUUM за {time.monotonic() - started:.1f} с")
+
+        freed = 0
+        while self.is_idle():
+            pages = await loop.run_in_executor(None, self.db.vacuum, self.vacuum_pages)
+            freed += pages
+            if pages < self.vacuum_pages:
+                break
+
+        self.archived += archived
+        self.vacuumed_pages += freed
+        if archived or freed:
+            print(f"🗄 БД: в архив {archived} строк, освобождено {freed} страниц")
+
+    def stats(self) -> dict:
+        return {
+            'archived': self.archived,
+            'vacuumed_pages': self.vacuumed_pages,
+            'failures': self.failures,
+            **self.db.size_stats(),
+        }
@@ -1,20 +1,28 @@
 """
 Main application - Twitch AI Girl Streamer (VRM Edition)
 """
-import asyncio
 import time
+IMPORTS_STARTED = time.perf_counter()
+
+import asyncio
 import threading
 from datetime import datetime
+from typing import Dict, List, Tuple
 import config
-from utils.mok_chat import start_mok_bot
-from twitch_chat import start_chat_bot
 from ai_brain import AIBrain
 from voice_engine import VoiceEngine
 from avatar_animator import AvatarAnimator
+from response_pipeline import ResponsePipeline
+from message_scheduler import MessageScheduler
+from memory_digest import MemoryDigester
+from db_maintenance import DbMaintenance
 from web_server import start_server
 import sys
 from utils.message_filter import MessageFilter
-from data.db import AppDb
+from data.db import AppDb, UserMessage
+# Chat backends (twitchio / file) are imported in start() for the selected mode only
+
+IMPORTS_DONE = time.perf_counter()
 
 class TwitchAIGirl:
     """Main application class"""
@@ -26,6 +34,10 @@ class TwitchAIGirl:
         print("=" * 60)
         # Mode 
         self.mode = mode
+        
+        # Startup timeline: seconds since process start when each part became ready
+        init_started = time.perf_counter()
+        self.startup_timings: Dict[str, float] = {'imports': IMPORTS_DONE - IMPORTS_STARTED}
 
         # Initialize components
         self.ai_brain = AIBrain()
@@ -33,13 +45,31 @@ class TwitchAIGirl:
         self.avatar = AvatarAnimator()
         self.chat_bot = None
         
-        # State
-        self.last_response_time = 0
-        self.is_processing = False
-        self.message_queue = asyncio.Queue()
+        # LLM -> TTS -> playback stages
+        self.pipeline = ResponsePipeline(self.ai_brain, self.voice_engine, self.avatar)
+        
+        # Picks the best buffered message whenever a response slot frees up
+        self.scheduler = MessageScheduler(self.ai_brain.db)
+        self.scheduler_task = None
+        
+        # Summarizes regulars' history while nothing is being answered
+        self.digester = MemoryDigester(
+            self.ai_brain,
+            is_idle=lambda: self.pipeline.in_flight == 0 and len(self.scheduler) == 0,
+        )
+        self.digest_task = None
+        
+        # Archives old chat log and vacuums the database while nothing is being answered
+        self.db_maintenance = DbMaintenance(
+            self.ai_brain.db,
+            is_idle=lambda: self.pipeline.in_flight == 0 and len(self.scheduler) == 0,
+        )
+        self.maintenance_task = None
         
         # Filter 
         self.message_filter = MessageFilter()
+        
+        self.startup_timings['init'] = time.perf_counter() - init_started
 
     async def process_message(self, username: str, message: str):
         """
@@ -49,71 +79,30 @@ class TwitchAIGirl:
             username: Username who sent the message
             message: Message content
         """
-        # Check cooldown
-        current_time = time.time()
-        if self.mode != 'no_bot' and current_time - self.last_response_time < config.MESSAGE_COOLDOWN:
-            print(f"⏳ Cooldown active, skipping message from {username}")
-            return
-        
-        # Check if already processing
-        if self.is_processing:
-            print(f"⏳ Уже обрабатываю сообщение, пропускаю: {username}")
-            return
+        reason = self.message_filter.check(username, message)
+        self._accept_message(username, message, reason)
+    
+    async def process_messages(self, messages: List[Tuple[str, str]]):
+        """
+        Process a burst of chat messages, filter rules run once over the whole batch
         
-        if self.message_filter.should_ignore_message(username, message):
-            print(f"Плохое сообщение，пропускаю: {username}")
+        Args:
+            messages: [(username, message)]
+        """
+        reasons = self.message_filter.filter_batch(messages)
+        for (username, message), reason in zip(messages, reasons):
+            self._accept_message(username, message, reason)
+    
+    def _accept_message(self, username: str, message: str, reason: str = None):
+        """Buffer message for scheduling, or log it as skipped if a filter rule matched"""
+        if reason:
+            print(f"🚫 Фильтр ({reason}), пропускаю: {username}")
+            self.ai_brain.db.add_skipped_message(UserMessage(username=username, text=message), f'filter:{reason}')
             return
 
-        self.is_processing = True
-        
-        try:
-            # Get AI response
-            print(f"\n🤖 Генерация ответа для {username}...")
-            response = await self.ai_brain.get_response(username, message)
-            
-            if not response:
-                return
-            
-            print(f"💭 Ответ: {response}")
-            
-            # Generate audio file
-            audio_file = await self.voice_engine.text_to_speech(response)
-            
-            if not audio_file:
-                print("❌ Не удалось сгенерировать аудио")
-                return
-            
-            # Get audio duration
-            duration = await self.voice_engine.get_audio_duration(audio_file)
-            
-            # Start talking animation
-            await self.avatar.start_talking()
-            
-            # Send audio to browser for playback
-            await self.avatar.vrm_controller.play_audio(audio_file)
-            
-            # Wait for audio to finish
-            await asyncio.sleep(duration)
-            
-            # Stop talking animation
-            await self.avatar.stop_talking()
-            
-            # Clean up audio file
-            import os
-            try:
-                os.remove(audio_file)
-            except:
-                pass
-            
-            print(f"✓ Ответ воспроизведен ({duration:.1f}s)\n")
-            
-            self.last_response_time = time.time()
-            
-        except Exception as e:
-            print(f"❌ Ошибка обработки сообщения: {e}")
-            await self.avatar.stop_talking()
-        finally:
-            self.is_processing = False
+        # Buffer for scheduling, drop only if buffer is full of better messages (logged as skipped)
+        if not self.scheduler.add(username, message):
+            print(f"⏳ Буфер сообщений заполнен, пропускаю: {username}")
     
     async def start(self):
         """Start the application"""
@@ -123,27 +112,41 @@ class TwitchAIGirl:
         if not self._validate_config():
             return
         
-        # Start HTTP server for VRM viewer (in separate thread)
-        print("🌐 Запуск HTTP сервера...")
-        http_thread = threading.Thread(target=start_server, daemon=True)
-        http_thread.start()
+        started = time.perf_counter()
         
-        # Give HTTP server time to start
-        await asyncio.sleep(1)
+        # Spawn audio workers while everything else starts
+        self.voice_engine.start()
         
-        # Start avatar (WebSocket server + browser)
-        print("🎨 Запуск VRM аватара...")
-        avatar_task = asyncio.create_task(self.avatar.start())
+        # Independent parts start concurrently, each gated on a real readiness signal
+        await asyncio.gather(
+            self._start_viewer(started),
+            self._warm_up_llm(started),
+            self._timed(started, 'tts', self.voice_engine.warm_up()),
+        )
+        
+        # Start response pipeline workers and scheduler
+        self.pipeline.start()
+        self.scheduler_task = asyncio.create_task(self.scheduler.run(self.pipeline))
+        if config.DIGEST_ENABLED:
+            self.digest_task = asyncio.create_task(self.digester.run())
+        self.maintenance_task = asyncio.create_task(self.db_maintenance.run())
         
-        # Give browser time to open
-        await asyncio.sleep(3)
         # Start chat bot
         if self.mode == 'no_bot':
             print("Подключение к файлу...")
-            self.chat_bot = await start_mok_bot(self.process_message)
+            from utils.mok_chat import start_mok_bot
+            self.chat_bot = await start_mok_bot(
+                self.process_message, path=config.MOCK_CHAT_PATH, batch_callback=self.process_messages
+            )
         else:
             print("💬 Подключение к Twitch чату...")
+            from twitch_chat import start_chat_bot
             self.chat_bot = await start_chat_bot(self.process_message)
+        chat_task = asyncio.create_task(self.chat_bot.start())
+        if await self._wait_ready(self.chat_bot.ready, chat_task, config.STARTUP_TIMEOUT):
+            self.startup_timings['chat'] = time.perf_counter() - started
+        
+        self._print_startup_timings(started)
         
         print("\n" + "=" * 60)
         print("✨ ВСЕ СИСТЕМЫ ЗАПУЩЕНЫ! ✨")
@@ -156,7 +159,7 @@ class TwitchAIGirl:
         
         # Run bot
         try:
-            await self.chat_bot.start()
+            await chat_task
         except KeyboardInterrupt:
             print("\n\n👋 Завершение работы...")
         except Exception as e:
@@ -164,6 +167,73 @@ class TwitchAIGirl:
         finally:
             await self.cleanup()
     
+    async def _start_viewer(self, started: float):
+        """Start HTTP + WebSocket servers, open the viewer and wait for it to connect"""
+        # Start HTTP server for VRM viewer (in separate thread)
+        print("🌐 Запуск HTTP сервера...")
+        http_ready = threading.Event()
+        http_thread = threading.Thread(target=start_server, args=(http_ready,), daemon=True)
+        http_thread.start()
+        
+        # Start avatar WebSocket server meanwhile
+        print("🎨 Запуск VRM аватара...")
+        avatar_task = asyncio.create_task(self.avatar.start(open_browser=False))
+        
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, http_ready.wait, config.STARTUP_TIMEOUT):
+            self.startup_timings['http'] = time.perf_counter() - started
+        else:
+            print("⚠ HTTP сервер не запустился")
+        
+        if not await self._wait_ready(self.avatar.ready, avatar_task, config.STARTUP_TIMEOUT):
+            print("⚠ WebSocket сервер аватара не запустился")
+            return
+        self.startup_timings['websocket'] = time.perf_counter() - started
+        
+        # An open viewer (e.g. OBS browser source) reconnects by itself
+        controller = self.avatar.vrm_controller
+        if not controller.client_connected.is_set():
+            await loop.run_in_executor(None, self.avatar.open_viewer)
+        if await controller.wait_for_client(config.STARTUP_VIEWER_TIMEOUT):
+            self.startup_timings['viewer'] = time.perf_counter() - started
+        else:
+            print("⚠ VRM viewer не подключился, продолжаю без него")
+    
+    async def _warm_up_llm(self, started: float):
+        """Open LLM connections before the first chat message"""
+        if config.LLM_PREWARM and await self.ai_brain.warm_up():
+            self.startup_timings['llm'] = time.perf_counter() - started
+    
+    async def _timed(self, started: float, name: str, coro):
+        """Await coro and record when it finished"""
+        try:
+            return await coro
+        finally:
+            self.startup_timings[name] = time.perf_counter() - started
+    
+    @staticmethod
+    async def _wait_ready(event: asyncio.Event, task: asyncio.Task, timeout: float) -> bool:
+        """
+        Wait for a component's ready event
+        
+        Returns:
+            False on timeout or if the component's task finished first
+        """
+        waiter = asyncio.create_task(event.wait())
+        await asyncio.wait({waiter, task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        return event.is_set()
+    
+    def _print_startup_timings(self, started: float):
+        """Print how long each part of startup took"""
+        timings = self.startup_timings
+        print("\n⏱ Время запуска:")
+        print(f"  импорты: {timings['imports']:.2f}s, инициализация: {timings['init']:.2f}s")
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1]):
+            if name not in ('imports', 'init'):
+                print(f"  {name:<10} готов через {seconds:.2f}s")
+        print(f"  итого с запуска процесса: {time.perf_counter() - IMPORTS_STARTED:.2f}s")
+    
     def _validate_config(self) -> bool:
         """Validate configuration"""
         errors = []
@@ -190,12 +260,32 @@ class TwitchAIGirl:
         """Cleanup resources"""
         print("🧹 Очистка ресурсов...")
         
+        if self.scheduler_task:
+            self.scheduler_task.cancel()
+        if self.digest_task:
+            self.digest_task.cancel()
+            print(f"🧠 Заметки: {self.digester.stats()}")
+        print(f"🚫 Фильтр: {self.message_filter.stats()}")
+        if self.maintenance_task:
+            self.maintenance_task.cancel()
+            print(f"🗄 Обслуживание БД: {self.db_maintenance.stats()}")
+        await self.pipeline.stop()
+        
         if self.voice_engine:
+            if self.voice_engine.audio_pool:
+                print(f"📊 Аудио-пул: {self.voice_engine.audio_pool.stats()}")
             self.voice_engine.stop()
         
         if self.avatar:
             await self.avatar.stop()
         
+        if self.ai_brain:
+            print(f"📏 Размер промптов: {self.ai_brain.prompt_builder.stats()}")
+            print(f"🛰 LLM: {self.ai_brain.llm.stats()}")
+            # Write queued chat log before exit
+            self.ai_brain.db.close()
+            print(f"💾 Сообщений записано в БД: {self.ai_brain.db.flushed_rows}, отброшено: {self.ai_brain.db.dropped_rows}")
+        
         print("✓ Завершено")
 
 
@@ -0,0 +1,111 @@
+"""
+Memory Digest - compacts chatters' history into short notes in idle time
+"""
+import asyncio
+from typing import Callable
+import config
+from ai_brain import AIBrain
+
+
+class MemoryDigester:
+    """
+    Background job that keeps a digest per active chatter
+
+    Each pass takes users who wrote since the last pass, reads their messages
+    after the digest's high-water mark (last_message_id) and folds them into
+    the digest with a cheap LLM call. Runs only while is_idle() is true, so it
+    never competes with answering chat.
+    """
+
+    def __init__(
+        self,
+        ai_brain: AIBrain,
+        is_idle: Callable[[], bool],
+        interval: float = config.DIGEST_INTERVAL,
+        min_new_messages: int = config.DIGEST_MIN_NEW_MESSAGES,
+        batch_messages: int = config.DIGEST_BATCH_MESSAGES,
+    ):
+        """
+        Initialize digester
+
+        Args:
+            ai_brain: AIBrain (LLM client, database, active users)
+            is_idle: Returns True when no response is queued or being prepared
+            interval: Seconds between passes
+            min_new_messages: New messages needed to update a digest
+            batch_messages: Max messages per LLM call
+        """
+        self.ai_brain = ai_brain
+        self.db = ai_brain.db
+        self.is_idle = is_idle
+        self.interval = interval
+        self.min_new_messages = min_new_messages
+        self.batch_messages = batch_messages
+
+        # Stats
+        self.updated = 0
+        self.messages_digested = 0
+        self.failures = 0
+
+    async def run(self):
+        """Run digest passes forever"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.digest_pass()
+            except Exception as e:
+                self.failures += 1
+                print(f"⚠ Ошибка обновления заметок: {e}")
+
+    async def digest_pass(self):
+        """Update digests of users who wrote since the last pass"""
+        users = list(self.ai_brain.active_users)
+        self.ai_brain.active_users.clear()
+
+        for i, username in enumerate(users):
+            if not self.is_idle():
+                # Chat is busy: postpone the rest
+                self.ai_brain.active_users.update(users[i:])
+                return
+            try:
+                more = await self.digest_user(username)
+            except Exception:
+                self.ai_brain.active_users.update(users[i:])
+                raise
+            if more:
+                self.ai_brain.active_users.add(username)
+
+    async def digest_user(self, username: str) -> bool:
+        """
+        Fold user's new messages into the digest
+
+        Args:
+            username: Username
+
+        Returns:
+            True if the user still has messages to digest
+        """
+        loop = asyncio.get_running_loop()
+        digest, last_id = await loop.run_in_executor(None, self.db.get_digest, username) or ("", 0)
+        rows = await loop.run_in_executor(
+            None, self.db.get_messages_after, username, last_id, self.batch_messages
+        )
+        if len(rows) < self.min_new_messages:
+            # Too little to summarize yet, checked again after the user writes more
+            return False
+
+        digest = await self.ai_brain.summarize_user(username, digest, [text for _, text in rows])
+        await loop.run_in_executor(None, self.db.save_digest, username, digest, rows[-1][0])
+        self.ai_brain.forget_user_lines(username)
+
+        self.updated += 1
+        self.messages_digested += len(rows)
+        print(f"🧠 Заметка о {username} обновлена (+{len(rows)} сообщений)")
+        return len(rows) == self.batch_messages
+
+    def stats(self) -> dict:
+        return {
+            'updated': self.updated,
+            'messages': self.messages_digested,
+            'failures': self.failures,
+        }
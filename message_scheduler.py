@@ -0,0 +1,225 @@
+"""
+Message Scheduler - buffers chat and picks the best message to answer next
+"""
+import asyncio
+import bisect
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+import config
+from data.db import AppDb, UserMessage
+
+
+@dataclass
+class ScheduledMessage:
+    """Chat message waiting for a response slot"""
+    username: str
+    message: str
+    score: float
+    received_at: float = field(default_factory=time.time)
+
+
+class MessageScheduler:
+    """
+    Bounded, time-windowed priority buffer for incoming chat
+
+    Messages are scored once on arrival. Age lowers every score at the same
+    rate, so ordering by (score + age_weight * received_at) never changes and
+    the buffer can stay sorted. Capacity is fixed, so add/pop cost and memory
+    don't grow with chat speed.
+    """
+
+    def __init__(
+        self,
+        db: AppDb,
+        capacity: int = config.SCHEDULER_CAPACITY,
+        max_age: float = config.SCHEDULER_MAX_AGE,
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            db: Database used to detect first-time chatters and log dropped messages
+            capacity: Max buffered messages, the lowest priority one is evicted
+            max_age: Seconds after which a buffered message expires
+        """
+        self.db = db
+        self.capacity = capacity
+        self.max_age = max_age
+
+        # Sorted by (priority, seq), best message is the last one
+        self._entries: List[tuple] = []
+        self._seq = itertools.count()
+
+        # username -> has history, bounded LRU to avoid a DB hit per message
+        self._known_users: OrderedDict = OrderedDict()
+        self._known_users_limit = 4096
+
+        self._wakeup = asyncio.Event()
+        self._last_dispatch = 0.0
+
+        # Stats
+        self.received = 0
+        self.evicted = 0
+        self.expired = 0
+        self.dispatched = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _is_first_time(self, username: str) -> bool:
+        """Check (and cache) whether user has no stored messages"""
+        key = username.lower()
+        if key in self._known_users:
+            self._known_users.move_to_end(key)
+            return not self._known_users[key]
+
+        has_history = self.db.has_user(username)
+        self._remember_user(key, has_history)
+        return not has_history
+
+    def _remember_user(self, key: str, has_history: bool):
+        """Store user's history flag in the LRU"""
+        self._known_users[key] = has_history
+        self._known_users.move_to_end(key)
+        if len(self._known_users) > self._known_users_limit:
+            self._known_users.popitem(last=False)
+
+    def mark_known(self, username: str):
+        """Record that user's message is being answered, no first-time bonus from now on"""
+        self._remember_user(username.lower(), True)
+
+    def score(self, username: str, message: str) -> float:
+        """
+        Score message relevance (higher is better)
+
+        Args:
+            username: Username who sent the message
+            message: Message content
+
+        Returns:
+            Score before age penalty
+        """
+        text = message.lower()
+        score = 0.0
+
+        if config.CHARACTER_NAME.lower() in text:
+            score += config.SCHEDULER_WEIGHT_MENTION
+        if '?' in text:
+            score += config.SCHEDULER_WEIGHT_QUESTION
+        if self._is_first_time(username):
+            score += config.SCHEDULER_WEIGHT_FIRST_TIME
+
+        return score
+
+    def add(self, username: str, message: str) -> bool:
+        """
+        Buffer message for scheduling
+
+        Returns:
+            False if message was rejected because buffer is full of better ones
+        """
+        now = time.time()
+        entry = ScheduledMessage(username=username, message=message, score=self.score(username, message), received_at=now)
+        priority = entry.score + config.SCHEDULER_WEIGHT_AGE * now
+        self.received += 1
+
+        self._expire(now)
+        if len(self._entries) >= self.capacity:
+            # Full: replace the worst entry only if the new one is better
+            if priority <= self._entries[0][0]:
+                self.evicted += 1
+                self._skip(entry, 'buffer_full')
+                return False
+            self._skip(self._entries.pop(0)[2], 'evicted')
+            self.evicted += 1
+
+        bisect.insort(self._entries, (priority, next(self._seq), entry))
+        self._wakeup.set()
+        return True
+
+    def pop_best(self) -> Optional[ScheduledMessage]:
+        """Remove and return the highest priority message"""
+        self._expire(time.time())
+        if not self._entries:
+            return None
+        return self._entries.pop()[2]
+
+    def _expire(self, now: float):
+        """Drop messages older than max_age"""
+        if not self._entries:
+            return
+        deadline = now - self.max_age
+        kept = []
+        for e in self._entries:
+            if e[2].received_at >= deadline:
+                kept.append(e)
+            else:
+                self._skip(e[2], 'expired')
+        self.expired += len(self._entries) - len(kept)
+        self._entries = kept
+
+    def _skip(self, entry: ScheduledMessage, reason: str):
+        """Log message that won't be answered"""
+        self.db.add_skipped_message(
+            UserMessage(username=entry.username, text=entry.message, timestamp=datetime.fromtimestamp(entry.received_at)),
+            reason,
+        )
+
+    def notify(self):
+        """Wake up dispatcher (e.g. when a response slot frees up)"""
+        self._wakeup.set()
+
+    async def run(self, pipeline):
+        """
+        Feed the best buffered message to the pipeline whenever it has a free slot
+
+        Args:
+            pipeline: ResponsePipeline instance
+        """
+        pipeline.on_finish = self.notify
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while pipeline.has_slot() and self._entries:
+                wait = config.MESSAGE_COOLDOWN - (time.time() - self._last_dispatch)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                # Busy chat: answer the best few messages with one LLM request,
+                # never more than the free slots (every answer is played, max_in_flight holds)
+                count = 1
+                free_slots = pipeline.free_slots()
+                if (
+                    config.BATCH_ENABLED
+                    and len(self._entries) >= config.BATCH_MIN_MESSAGES
+                    and free_slots >= config.BATCH_MIN_MESSAGES
+                ):
+                    count = min(config.BATCH_MAX_MESSAGES, free_slots)
+                entries = []
+                while len(entries) < count:
+                    entry = self.pop_best()
+                    if entry is None:
+                        break
+                    entries.append(entry)
+                if not entries:
+                    break
+
+                if len(entries) > 1:
+                    accepted = pipeline.submit_batch([(e.username, e.message) for e in entries])
+                else:
+                    accepted = pipeline.submit(entries[0].username, entries[0].message)
+
+                if accepted:
+                    self._last_dispatch = time.time()
+                    self.dispatched += len(entries)
+                    for entry in entries:
+                        self.mark_known(entry.username)
+                else:
+                    for entry in entries:
+                        self._skip(entry, 'pipeline_full')
@@ -0,0 +1,259 @@
+"""
+Response Pipeline - overlaps LLM generation, TTS rendering and playback
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+import config
+from voice_engine import AudioClip
+
+
+@dataclass
+class ResponseJob:
+    """Single chat message travelling through the pipeline"""
+    username: str
+    message: str
+    response: str = ""
+    audio: Optional[AudioClip] = None
+    last: bool = True  # Final part of the answer (streaming sends one job per sentence)
+    created_at: float = field(default_factory=time.time)
+
+
+class ResponsePipeline:
+    """
+    Three-stage pipeline: LLM -> TTS -> playback
+
+    Every stage has its own bounded queue, so message N+1 is generated
+    and rendered while message N is still playing. With streaming enabled
+    every sentence travels as its own job, so the first sentence is spoken
+    while the model is still writing the rest. Under load several messages
+    can be submitted as one batch and answered with a single LLM request.
+    """
+
+    def __init__(
+        self,
+        ai_brain,
+        voice_engine,
+        avatar,
+        queue_size: int = config.PIPELINE_QUEUE_SIZE,
+        max_in_flight: int = config.PIPELINE_MAX_IN_FLIGHT,
+    ):
+        """
+        Initialize pipeline
+
+        Args:
+            ai_brain: AIBrain instance
+            voice_engine: VoiceEngine instance
+            avatar: AvatarAnimator instance
+            queue_size: Max jobs waiting in front of each stage
+            max_in_flight: Response slots, i.e. jobs accepted but not yet played
+        """
+        self.ai_brain = ai_brain
+        self.voice_engine = voice_engine
+        self.avatar = avatar
+
+        self.generate_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.synthesize_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.playback_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+        self.tasks: List[asyncio.Task] = []
+        self._playback_end = 0.0  # When the last clip sent to the browser ends
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0  # Accepted jobs not yet played or dropped
+        self.on_finish: Optional[Callable[[], None]] = None  # Called when a slot frees up
+
+    def start(self):
+        """Start stage workers"""
+        if self.tasks:
+            return
+        self.tasks = [
+            asyncio.create_task(self._generate_worker()),
+            asyncio.create_task(self._synthesize_worker()),
+            asyncio.create_task(self._playback_worker()),
+        ]
+
+    async def stop(self):
+        """Stop stage workers"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def has_capacity(self) -> bool:
+        """Check if the first stage can take another message"""
+        return not self.generate_queue.full()
+
+    def has_slot(self) -> bool:
+        """Check if a response slot is free"""
+        return self.free_slots() > 0
+
+    def free_slots(self) -> int:
+        """Response slots still free, a batch of N messages takes N of them"""
+        if not self.has_capacity():
+            return 0
+        return max(0, self.max_in_flight - self.in_flight)
+
+    def submit(self, username: str, message: str) -> bool:
+        """
+        Put message into the pipeline without waiting
+
+        Returns:
+            False if the first stage is full
+        """
+        try:
+            self.generate_queue.put_nowait(ResponseJob(username=username, message=message))
+        except asyncio.QueueFull:
+            return False
+        self.in_flight += 1
+        return True
+
+    def submit_batch(self, messages: List[Tuple[str, str]]) -> bool:
+        """
+        Put several messages into the pipeline as one LLM request
+
+        Args:
+            messages: (username, message) pairs
+
+        Returns:
+            False if the first stage is full
+        """
+        jobs = [ResponseJob(username=username, message=message) for username, message in messages]
+        try:
+            self.generate_queue.put_nowait(jobs)
+        except asyncio.QueueFull:
+            return False
+        self.in_flight += len(jobs)
+        return True
+
+    def _finish(self):
+        """Mark job as finished (played or dropped)"""
+        self.in_flight = max(0, self.in_flight - 1)
+        if self.on_finish:
+            self.on_finish()
+
+    async def _generate_worker(self):
+        """Stage 1: LLM response"""
+        while True:
+            job: ResponseJob = await self.generate_queue.get()
+            if isinstance(job, list):
+                await self._generate_batch(job)
+                continue
+            try:
+                print(f"\n🤖 Генерация ответа для {job.username}...")
+                if config.STREAM_RESPONSES:
+                    await self._generate_streaming(job)
+                    continue
+                
+                job.response = await self.ai_brain.get_response(job.username, job.message)
+                if not job.response:
+                    self._finish()
+                    continue
+                print(f"💭 Ответ: {job.response}")
+                await self.synthesize_queue.put(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка генерации ответа: {e}")
+                self._finish()
+
+    async def _generate_batch(self, jobs: List[ResponseJob]):
+        """Answer a batch with one request, then send every answer to TTS"""
+        queued = 0
+        try:
+            print(f"\n🤖 Пакетная генерация ответов: {', '.join(job.username for job in jobs)}...")
+            responses = await self.ai_brain.get_batch_responses([(job.username, job.message) for job in jobs])
+            for job, response in zip(jobs, responses):
+                queued += 1
+                if not response:
+                    self._finish()
+                    continue
+                job.response = response
+                print(f"💭 Ответ для {job.username}: {job.response}")
+                await self.synthesize_queue.put(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка генерации ответа: {e}")
+            for _ in jobs[queued:]:
+                self._finish()
+
+    async def _generate_streaming(self, job: ResponseJob):
+        """Send every finished sentence to TTS, then an empty closing job"""
+        submitted = False
+        try:
+            async for sentence in self.ai_brain.stream_response(job.username, job.message):
+                print(f"💭 Ответ: {sentence}")
+                await self.synthesize_queue.put(
+                    ResponseJob(username=job.username, message=job.message, response=sentence, last=False)
+                )
+                submitted = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not submitted:
+                raise
+            # Sentences are already queued: the closing job still has to stop talking and finish the job
+            print(f"❌ Ошибка генерации ответа: {e}")
+        job.response = ""
+        await self.synthesize_queue.put(job)
+
+    async def _synthesize_worker(self):
+        """Stage 2: TTS + enhancement"""
+        while True:
+            job: ResponseJob = await self.synthesize_queue.get()
+            try:
+                if job.response:
+                    job.audio = await self.voice_engine.synthesize(job.response)
+                    if not job.audio:
+                        print("❌ Не удалось сгенерировать аудио")
+                        if job.last:
+                            self._finish()
+                        continue
+                await self.playback_queue.put(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка генерации речи: {e}")
+                if job.last:
+                    self._finish()
+
+    async def _playback_worker(self):
+        """Stage 3: send audio to browser and wait for it to finish"""
+        while True:
+            job: ResponseJob = await self.playback_queue.get()
+            try:
+                if job.audio:
+                    # Send clip shortly before the previous one ends, the viewer queues it
+                    await self._sleep_until(self._playback_end - config.PLAYBACK_PREFETCH)
+                    
+                    if not self.avatar.is_talking:
+                        await self.avatar.start_talking()
+                    
+                    await self.avatar.vrm_controller.play_audio_bytes(job.audio.data, job.audio.duration, job.audio.envelope)
+                    self._playback_end = max(time.time(), self._playback_end) + job.audio.duration
+                
+                if job.last:
+                    if self.playback_queue.empty():
+                        await self._sleep_until(self._playback_end)
+                    
+                    # Keep talking if the next answer is already rendered
+                    if self.playback_queue.empty():
+                        await self.avatar.stop_talking()
+                    
+                    print("✓ Ответ воспроизведен\n")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка воспроизведения: {e}")
+                await self.avatar.stop_talking()
+            finally:
+                if job.last:
+                    self._finish()
+
+    @staticmethod
+    async def _sleep_until(deadline: float):
+        """Sleep until time.time() reaches deadline"""
+        delay = deadline - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
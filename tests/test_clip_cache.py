@@ -0,0 +1,58 @@
+"""
+Clip cache: directory reconciled with the (delayed) index on load
+"""
+import asyncio
+import json
+import os
+
+from utils.clip_cache import ClipCache
+
+
+def test_unindexed_files_are_reconciled_on_load(tmp_path):
+    (tmp_path / 'kept.mp3').write_bytes(b'k' * 10)
+    (tmp_path / 'kept.env').write_bytes(b'\x01\x02')
+    (tmp_path / ClipCache.INDEX_FILE).write_text(json.dumps({
+        'kept': {'size': 10, 'duration': 1.0, 'envelope': True, 'last_used': 1.0},
+        'gone': {'size': 5, 'duration': 1.0, 'envelope': False, 'last_used': 1.0},
+    }))
+    # Stored after the last index save, then the process was killed
+    (tmp_path / 'late.mp3').write_bytes(b'l' * 20)
+    (tmp_path / 'late.env').write_bytes(b'\x03')
+    # Leftovers of interrupted writes
+    (tmp_path / 'half.mp3.part').write_bytes(b'h')
+    (tmp_path / 'lost.env').write_bytes(b'\x04')
+
+    cache = ClipCache(str(tmp_path), max_bytes=1000)
+
+    assert cache.total_bytes == 30
+    assert not (tmp_path / 'half.mp3.part').exists()
+    assert not (tmp_path / 'lost.env').exists()
+    data, duration, envelope = asyncio.run(cache.read_async('late'))
+    assert (data, duration, envelope) == (b'l' * 20, None, b'\x03')
+
+
+def test_adopted_clips_count_against_budget(tmp_path):
+    (tmp_path / 'old.mp3').write_bytes(b'o' * 60)
+    (tmp_path / 'new.mp3').write_bytes(b'n' * 60)
+    os.utime(tmp_path / 'old.mp3', (1, 1))
+
+    cache = ClipCache(str(tmp_path), max_bytes=100)
+
+    assert cache.total_bytes == 60
+    assert not (tmp_path / 'old.mp3').exists()
+    assert (tmp_path / 'new.mp3').exists()
+
+
+def test_concurrent_stores_of_one_key_write_once(tmp_path):
+    cache = ClipCache(str(tmp_path), max_bytes=1000)
+
+    async def scenario():
+        await asyncio.gather(
+            cache.store_async('key', b'first', 1.0, b'\x01'),
+            cache.store_async('key', b'second', 1.0, b'\x02'),
+        )
+        return await cache.read_async('key')
+
+    assert asyncio.run(scenario()) == (b'first', 1.0, b'\x01')
+    assert cache.total_bytes == len(b'first')
+    assert not list(tmp_path.glob('*.part'))
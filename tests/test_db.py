@@ -0,0 +1,41 @@
+"""
+AppDb write-behind queue: reads see unflushed messages exactly once
+"""
+import sqlite3
+
+import pytest
+
+from data.db import AppDb, UserMessage
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Long interval: rows stay queued until flush() is called
+    db = AppDb(tmp_path / 'app_db.db', flush_interval=60, batch_size=1000, index=False)
+    yield db
+    db.close()
+
+
+def test_unflushed_messages_are_read_per_user(db):
+    db.add_message(UserMessage(username='alice', text='привет'))
+    db.add_message(UserMessage(username='bob', text='hi'))
+    db.add_message(UserMessage(username='alice', text='как дела'))
+
+    assert db.has_user('alice') and not db.has_user('carol')
+    assert db.get_user_messages_text_only('alice') == ['привет', 'как дела']
+
+    db.flush()
+    db.add_message(UserMessage(username='alice', text='пока'))
+    assert db.get_user_messages_text_only('alice') == ['привет', 'как дела', 'пока']
+    assert sorted(db.get_all_users()) == ['alice', 'bob']
+
+
+def test_writer_connection_checkpoints_itself(db):
+    assert db._write_conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0] == 0
+    db.add_message(UserMessage(username='alice', text='привет'))
+    db.flush()
+    db._next_checkpoint = 0
+    db._checkpoint_if_due()
+    assert db._checkpointed_commits == db._commits
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM user_messages').fetchone()[0] == 1
@@ -0,0 +1,88 @@
+"""
+Message scheduler: first-time bonus and batch size vs free response slots
+"""
+import asyncio
+
+import pytest
+
+import config
+from message_scheduler import MessageScheduler
+
+
+class StubDb:
+    def __init__(self):
+        self.skipped = []
+
+    def has_user(self, username):
+        return False
+
+    def add_skipped_message(self, message, reason):
+        self.skipped.append(reason)
+
+
+class StubPipeline:
+    def __init__(self, slots):
+        self.slots = slots
+        self.on_finish = None
+        self.submitted = []
+
+    def has_slot(self):
+        return self.slots > 0
+
+    def free_slots(self):
+        return self.slots
+
+    def submit(self, username, message):
+        self.slots -= 1
+        self.submitted.append([username])
+        return True
+
+    def submit_batch(self, messages):
+        self.slots -= len(messages)
+        self.submitted.append([username for username, _ in messages])
+        return True
+
+
+def dispatch(scheduler, pipeline):
+    async def scenario():
+        task = asyncio.create_task(scheduler.run(pipeline))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(scenario())
+    return pipeline.submitted
+
+
+@pytest.fixture(autouse=True)
+def no_cooldown(monkeypatch):
+    monkeypatch.setattr(config, 'MESSAGE_COOLDOWN', 0)
+    monkeypatch.setattr(config, 'BATCH_ENABLED', True)
+    monkeypatch.setattr(config, 'BATCH_MIN_MESSAGES', 3)
+    monkeypatch.setattr(config, 'BATCH_MAX_MESSAGES', 3)
+
+
+def test_first_time_bonus_ends_after_dispatch():
+    scheduler = MessageScheduler(StubDb())
+    first = scheduler.score('bob', 'hello')
+    scheduler.add('bob', 'hello')
+    dispatch(scheduler, StubPipeline(slots=1))
+
+    assert scheduler.score('bob', 'hello') == first - config.SCHEDULER_WEIGHT_FIRST_TIME
+
+
+def test_default_slots_allow_full_batch():
+    assert config.PIPELINE_MAX_IN_FLIGHT >= config.BATCH_MAX_MESSAGES
+
+    scheduler = MessageScheduler(StubDb())
+    for username in ('a', 'b', 'c', 'd'):
+        scheduler.add(username, 'hello')
+
+    assert [len(batch) for batch in dispatch(scheduler, StubPipeline(slots=config.PIPELINE_MAX_IN_FLIGHT))] == [3]
+
+
+def test_no_batch_below_min_free_slots():
+    scheduler = MessageScheduler(StubDb())
+    for username in ('a', 'b', 'c', 'd'):
+        scheduler.add(username, 'hello')
+
+    assert [len(batch) for batch in dispatch(scheduler, StubPipeline(slots=2))] == [1, 1]
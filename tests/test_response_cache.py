@@ -0,0 +1,110 @@
+"""
+Response cache: shared in-flight answers and fallback when the leader fails
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import ai_brain
+from data.db import AppDb
+from utils.response_cache import ResponseCache
+
+
+def make_cache() -> ResponseCache:
+    return ResponseCache(max_size=16, ttl=60, max_variants=1, max_key_length=60)
+
+
+def completion(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def chunk(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class BrokenStream:
+    """Streams one sentence, then fails like a dropped connection"""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = iter([chunk("Привет, рада тебя видеть в чате! "), chunk("А еще")])
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise ConnectionError("stream dropped")
+
+    async def close(self):
+        self.closed = True
+
+
+class StubLLM:
+    """LLMPool stand-in: streams break off, full completions succeed"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, stream: bool = False, **kwargs):
+        self.calls += 1
+        if stream:
+            return BrokenStream()
+        return completion("Отвечаю тебе лично!")
+
+
+@pytest.fixture
+def brain(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_brain, 'AppDb', lambda: AppDb(tmp_path / 'app_db.db', index=False))
+    brain = ai_brain.AIBrain()
+    brain.llm = StubLLM()
+    yield brain
+    brain.db.close()
+
+
+def test_waiter_gets_shared_answer():
+    async def scenario():
+        cache = make_cache()
+        key = cache.make_key("как дела")
+        assert cache.begin(key) is None
+        shared = cache.begin(key)
+        cache.finish(key, "alice", "Все отлично!")
+        return await cache.wait(shared, "bob")
+
+    assert asyncio.run(scenario()) == "Все отлично!"
+
+
+def test_waiter_falls_back_when_leader_has_no_answer():
+    async def scenario():
+        cache = make_cache()
+        key = cache.make_key("как дела")
+        cache.begin(key)
+        shared = cache.begin(key)
+        cache.finish(key, "alice", None)
+        return await cache.wait(shared, "bob")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_waiter_answers_itself_when_leader_stream_fails(brain):
+    async def scenario():
+        message = "как у тебя дела сегодня?"
+        leader = brain.stream_response("alice", message)
+        first = await leader.__anext__()
+
+        # Same question while the leader is still streaming: joins its in-flight answer
+        waiter = asyncio.create_task(brain.get_response("bob", message))
+        await asyncio.sleep(0)
+        rest = [sentence async for sentence in leader]
+        return first, rest, await waiter
+
+    first, rest, answer = asyncio.run(scenario())
+    assert first == "Привет, рада тебя видеть в чате!"
+    assert rest == []
+    assert answer == "Отвечаю тебе лично!"
+    assert brain.llm.calls == 2
+    # The cut-off answer isn't served to anyone later
+    assert brain.response_cache.stats()['size'] == 1  # Only the waiter's complete answer
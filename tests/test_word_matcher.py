@@ -0,0 +1,43 @@
+"""
+Banned-word matching: obfuscated words are caught, ordinary chat passes
+"""
+import pytest
+
+from utils.message_filter import MessageFilter
+from utils.word_matcher import WordMatcher
+
+
+@pytest.mark.parametrize('text', ["хуй", "хууууй", "х у й", "х.у.й", "XУЙ"])
+def test_obfuscated_word_is_found(text):
+    assert WordMatcher(['хуй']).find(text) == 'хуй'
+
+
+@pytest.mark.parametrize('text', ["as you wish", "Asia is big", "a ss"])
+def test_repeats_in_entry_are_required(text):
+    assert WordMatcher(['ass']).find(text) is None
+
+
+def test_repeats_in_message_are_collapsed():
+    assert WordMatcher(['ass']).find("assss") == 'ass'
+
+
+def test_whole_word_by_default():
+    matcher = WordMatcher(['чмо', 'дурак*'])
+    assert matcher.find("чмоки чмоки") is None
+    assert matcher.find("ты чмо") == 'чмо'
+    assert matcher.find("дураки") == 'дурак*'
+
+
+def test_phrase():
+    matcher = WordMatcher(['купи слона'])
+    assert matcher.find("Купи... слона!") == 'купи слона'
+    assert matcher.find("купи кота и слона") is None
+
+
+@pytest.mark.parametrize('message', ["чмоки чмоки", "чмок тебя", "жидко", "секса хочу", "as you wish", "Asia is big"])
+def test_common_words_pass_shipped_list(message):
+    assert MessageFilter().check('viewer', message) is None
+
+
+def test_shipped_list_still_blocks():
+    assert MessageFilter().check('viewer', "ну ты и пиздец") == 'bad_word'
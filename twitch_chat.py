@@ -24,11 +24,13 @@ class TwitchChatBot(commands.Bot):
         )
         self.message_callback = message_callback
         self.last_message_time = 0
+        self.ready = asyncio.Event()  # Connected to chat
         
     async def event_ready(self):
         """Called when bot is ready"""
         print(f'✓ Подключено к чату Twitch | Канал: {config.TWITCH_CHANNEL}')
         print(f'✓ Бот: {self.nick}')
+        self.ready.set()
         
     async def event_message(self, message):
         """Called when a message is received"""
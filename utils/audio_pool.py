@@ -0,0 +1,164 @@
+"""
+Process pool for audio post-processing (keeps pydub/NumPy work off the event loop)
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+def warm_worker():
+    """Pool initializer: import heavy modules and run ffmpeg once"""
+    try:
+        import numpy  # noqa: F401
+        import io
+        from pydub import AudioSegment
+        import utils.dsp  # noqa: F401
+
+        # First encode/decode pays for ffmpeg lookup and page cache
+        silence = AudioSegment.silent(duration=50)
+        buffer = io.BytesIO()
+        silence.export(buffer, format='mp3')
+        AudioSegment.from_file(io.BytesIO(buffer.getvalue()), format='mp3')
+    except Exception as e:
+        print(f"⚠ Аудио-воркер {os.getpid()}: прогрев не удался: {e}")
+
+
+def _timed_call(func: Callable, args: tuple) -> Tuple[Any, float, int]:
+    """Run func in worker, return (result, run seconds, worker pid)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start, os.getpid()
+
+
+class AudioProcessPool:
+    """
+    Bounded ProcessPoolExecutor with warm workers and per-job timing
+
+    At most max_pending jobs are submitted at once, further callers wait
+    (backpressure instead of an unbounded executor queue). A slot is freed
+    when the job really ends, a timed out job keeps it while it still runs.
+    A crashed worker breaks the executor, so it is replaced with a new one.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        """
+        Initialize pool
+
+        Args:
+            workers: Worker processes
+            max_pending: Max jobs submitted (queued + running)
+            timeout: Seconds before a job is abandoned
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+
+        # Last jobs: {'wait': s, 'run': s, 'total': s, 'pid': int}
+        self.timings: Deque[Dict[str, float]] = deque(maxlen=100)
+        self.jobs = 0
+        self.failures = 0
+        self.restarts = 0
+
+    def start(self):
+        """Spawn and warm up workers"""
+        if self.executor:
+            return
+        # spawn: forking a process with an event loop and threads is unsafe
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_worker,
+        )
+        for _ in range(self.workers):
+            self.executor.submit(os.getpid)
+        print(f"✓ Аудио-пул запущен: {self.workers} процесс(ов)")
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        """Replace a broken executor (once, however many jobs saw it break)"""
+        if self.executor is not broken:
+            return
+        print("⚠ Аудио-пул: воркер упал, перезапускаю процессы")
+        self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.start()
+
+    def _release(self, future: asyncio.Future):
+        """Done callback: free the slot, mark an abandoned job's error as retrieved"""
+        self._slots.release()
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, func: Callable, *args) -> Tuple[Any, Dict[str, float]]:
+        """
+        Run func(*args) in a worker process
+
+        Args:
+            func: Module-level (picklable) function
+
+        Returns:
+            (result, timing) where timing has wait/run/total seconds
+        """
+        if not self.executor:
+            self.start()
+
+        submitted = time.perf_counter()
+        await self._slots.acquire()
+        executor = self.executor
+        try:
+            job = executor.submit(_timed_call, func, args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self.failures += 1
+            self._restart(executor)
+            raise
+        except BaseException:
+            self._slots.release()
+            raise
+        future = asyncio.wrap_future(job)
+        future.add_done_callback(self._release)
+
+        try:
+            # shield: on timeout the job isn't interrupted, its slot stays taken until it ends
+            result, run_time, pid = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.CancelledError:
+            job.cancel()  # Only drops a job that is still queued
+            raise
+        except Exception as e:
+            self.failures += 1
+            job.cancel()
+            if isinstance(e, BrokenProcessPool):
+                self._restart(executor)
+            raise
+
+        total = time.perf_counter() - submitted
+        timing = {'wait': max(total - run_time, 0.0), 'run': run_time, 'total': total, 'pid': pid}
+        self.timings.append(timing)
+        self.jobs += 1
+        return result, timing
+
+    def stats(self) -> dict:
+        """Aggregated timing of recent jobs (seconds)"""
+        if not self.timings:
+            return {'jobs': self.jobs, 'failures': self.failures, 'restarts': self.restarts}
+        totals = sorted(t['total'] for t in self.timings)
+        return {
+            'jobs': self.jobs,
+            'failures': self.failures,
+            'restarts': self.restarts,
+            'avg_wait': sum(t['wait'] for t in self.timings) / len(self.timings),
+            'avg_run': sum(t['run'] for t in self.timings) / len(self.timings),
+            'p95_total': totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+        }
+
+    def shutdown(self):
+        """Stop workers"""
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
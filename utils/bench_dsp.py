@@ -0,0 +1,77 @@
+"""
+Benchmark: NumPy DSP chain vs pydub chain for voice enhancement
+
+Usage:
+    python utils/bench_dsp.py [seconds] [path/to/clip.mp3]
+
+Without a clip a synthetic speech-like signal is used (no ffmpeg needed).
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from pydub import AudioSegment
+from voice_engine import ENHANCEMENT_PARAMS, enhance_pydub
+from utils.dsp import enhance_numpy, segment_to_array
+
+
+def synthetic_speech(seconds: float, frame_rate: int = 24000) -> AudioSegment:
+    """Harmonic 'voice' with syllable-like amplitude envelope and pauses"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+
+    pitch = 210 + 25 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / frame_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+
+    syllables = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 2
+    pauses = (np.sin(2 * np.pi * 0.25 * t) > -0.6).astype(float)
+    noise = rng.normal(0, 0.02, t.shape)
+
+    signal = (voice * syllables * pauses * 0.25 + noise) * 32767 * 0.5
+    data = np.clip(signal, -32768, 32767).astype(np.int16).tobytes()
+    return AudioSegment(data=data, sample_width=2, frame_rate=frame_rate, channels=1)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 15.0
+    if len(sys.argv) > 2:
+        audio = AudioSegment.from_file(sys.argv[2])
+        print(f"📂 Клип: {sys.argv[2]} ({len(audio) / 1000:.1f}s)")
+    else:
+        audio = synthetic_speech(seconds)
+        print(f"🎛 Синтетический сигнал: {seconds:.1f}s, {audio.frame_rate} Hz")
+
+    reference, pydub_time = timed(enhance_pydub, audio, ENHANCEMENT_PARAMS)
+    enhanced, numpy_time = timed(enhance_numpy, audio, ENHANCEMENT_PARAMS)
+
+    ref = segment_to_array(reference)[:, 0]
+    out = segment_to_array(enhanced)[:, 0]
+    frames = min(len(ref), len(out))
+    ref, out = ref[:frames], out[:frames]
+
+    error = out - ref
+    full_scale = audio.max_possible_amplitude
+    snr = 10 * np.log10(np.sum(ref ** 2) / max(np.sum(error ** 2), 1e-12))
+    rms_error = np.sqrt(np.mean(error ** 2)) / full_scale
+
+    print("=" * 60)
+    print(f"pydub:  {pydub_time * 1000:8.1f} ms")
+    print(f"numpy:  {numpy_time * 1000:8.1f} ms  (x{pydub_time / max(numpy_time, 1e-9):.0f})")
+    print(f"length: {len(reference)} ms vs {len(enhanced)} ms")
+    print(f"RMS error: {rms_error * 100:.3f}% of full scale, SNR {snr:.1f} dB")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Exercise LLMPool against local stub OpenAI-compatible servers
+
+Usage:
+    python utils/bench_llm_pool.py [requests]
+
+Starts three stub backends on localhost: 'primary' with a slow tail,
+'flaky' that fails half of the requests and 'backup' that is steady.
+Prints client-side latency percentiles and per-endpoint stats (hedges,
+failovers, circuit breaker). No API keys or network access needed.
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.llm_pool import Endpoint, LLMPool
+
+
+class StubServer:
+    """Minimal HTTP server answering POST /v1/chat/completions"""
+
+    def __init__(self, name: str, latency, error_rate: float = 0.0):
+        """
+        Args:
+            name: Endpoint name (echoed in the reply)
+            latency: Callable returning seconds to wait before answering
+            error_rate: Share of requests answered with HTTP 500
+        """
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.port = None
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.decode('latin-1').split('\r\n'):
+                    if line.lower().startswith('content-length:'):
+                        length = int(line.split(':', 1)[1])
+                body = json.loads(await reader.readexactly(length) or b'{}')
+                self.requests += 1
+
+                await asyncio.sleep(self.latency())
+                if random.random() < self.error_rate:
+                    self._respond(writer, 500, {'error': {'message': f'{self.name} failed'}})
+                else:
+                    self._respond(writer, 200, self._completion(body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _completion(self, body: dict) -> dict:
+        return {
+            'id': f'stub-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': f'ответ от {self.name}'},
+                'finish_reason': 'stop',
+            }],
+        }
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        reason = 'OK' if status == 200 else 'Internal Server Error'
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data
+        )
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    random.seed(0)
+
+    servers = [
+        # Usually fast, every 5th request hangs for 3s
+        StubServer('primary', lambda: 3.0 if random.random() < 0.2 else random.uniform(0.05, 0.15)),
+        StubServer('flaky', lambda: random.uniform(0.05, 0.1), error_rate=0.5),
+        StubServer('backup', lambda: random.uniform(0.2, 0.3)),
+    ]
+    for server in servers:
+        await server.start()
+
+    pool = LLMPool(
+        [Endpoint(s.name, s.base_url, 'stub', 'stub-model', timeout=5, circuit_cooldown=2) for s in servers],
+        hedge_delay=0.5,
+    )
+    # Failover path: flaky first
+    flaky_pool = LLMPool([pool.endpoints[1], pool.endpoints[2]], hedge=False)
+
+    messages = [{'role': 'user', 'content': 'привет'}]
+    for name, target in (('hedging', pool), ('failover', flaky_pool)):
+        latencies = []
+        failures = 0
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                await target.create(messages=messages, max_tokens=10)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                failures += 1
+
+        print("=" * 60)
+        print(f"{name}: {len(latencies)} ok, {failures} failed")
+        if latencies:
+            print(
+                f"latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+                f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+                f"max {max(latencies) * 1000:.0f} ms"
+            )
+        print(json.dumps(target.stats(), indent=2, ensure_ascii=False))
+
+    print("=" * 60)
+    print("Запросов на серверах:", {s.name: s.requests for s in servers})
+    for endpoint in pool.endpoints:
+        await endpoint.client.close()
+    await asyncio.sleep(0.1)
+    for server in servers:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
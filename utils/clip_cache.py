@@ -0,0 +1,267 @@
+"""
+Content-addressed on-disk cache of rendered TTS clips
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def clip_key(text: str, lang: str, params: dict) -> str:
+    """
+    Cache key for a clip: hash of text, language and enhancement parameters
+
+    Args:
+        text: Spoken text
+        lang: TTS language
+        params: Enhancement parameters (anything that changes the audio)
+
+    Returns:
+        Hex digest
+    """
+    payload = json.dumps([text, lang, params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ClipCache:
+    """
+    LRU cache of audio clips with a size budget
+
+    Clips live in <directory>/<key>.mp3 (lip-sync envelope in <key>.env), the
+    index (size, duration, last use) lives in <directory>/index.json and
+    survives restarts. read_async()/store_async() work with bytes, all file
+    I/O runs in the default executor; the index is written at most once per
+    INDEX_SAVE_DELAY seconds and on flush(), not for every clip.
+    """
+
+    INDEX_FILE = 'index.json'
+    INDEX_SAVE_DELAY = 30.0
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Initialize cache
+
+        Args:
+            directory: Cache directory
+            max_bytes: Size budget for all clips
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._index: Dict[str, dict] = {}
+        self._storing: Set[str] = set()  # Keys whose files are being written
+        self.total_bytes = 0
+        self._save_task: Optional[asyncio.Task] = None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.mp3"
+
+    def _envelope_path(self, key: str) -> Path:
+        return self.directory / f"{key}.env"
+
+    def _load_index(self):
+        """
+        Load index and reconcile it with the directory
+
+        The index is saved with a delay, so after a crash the last clips are
+        on disk but not in it: such clips are adopted (counted against the
+        budget), leftover temp files and envelopes without a clip are deleted.
+        """
+        index_path = self.directory / self.INDEX_FILE
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files[entry.name] = entry
+
+        for key, meta in index.items():
+            if f"{key}.mp3" in files:
+                self._index[key] = meta
+                self.total_bytes += meta['size']
+
+        orphans = []
+        for name, entry in files.items():
+            key, suffix = os.path.splitext(name)
+            if suffix == '.mp3' and key not in self._index:
+                stat = entry.stat()
+                self._index[key] = {
+                    'size': stat.st_size,
+                    'duration': None,
+                    'envelope': f"{key}.env" in files,
+                    'last_used': stat.st_mtime,
+                }
+                self.total_bytes += stat.st_size
+            elif suffix == '.part' or (suffix == '.env' and f"{key}.mp3" not in files):
+                orphans.append(entry.path)
+        self._discard_all(orphans + self._evict())
+
+        if self._index:
+            print(f"✓ Кэш аудио: {len(self._index)} клипов, {self.total_bytes / 1e6:.1f} MB")
+
+    def _save_index(self, index: Dict[str, dict] = None):
+        """Write index (or a snapshot of it) atomically"""
+        index_path = self.directory / self.INDEX_FILE
+        tmp_path = index_path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index if index is None else index, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"⚠ Не удалось сохранить индекс кэша аудио: {e}")
+
+    def _schedule_save(self):
+        """Save index in INDEX_SAVE_DELAY seconds, changes until then go into the same write"""
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.INDEX_SAVE_DELAY)
+        snapshot = {key: dict(meta) for key, meta in self._index.items()}
+        await asyncio.get_running_loop().run_in_executor(None, self._save_index, snapshot)
+
+    async def read_async(self, key: str) -> Optional[Tuple[bytes, Optional[float], Optional[bytes]]]:
+        """
+        Read cached clip into memory, file I/O runs in the default executor
+
+        Returns:
+            (mp3 bytes, duration or None, envelope or None) or None on miss
+        """
+        meta = self._index.get(key)
+        if meta is None:
+            self.misses += 1
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+            data, envelope = await loop.run_in_executor(None, self._read_files, key, meta.get('envelope'))
+        except OSError:
+            self._forget(key)
+            self.misses += 1
+            return None
+
+        meta['last_used'] = time.time()
+        self.hits += 1
+        return data, meta.get('duration'), envelope
+
+    async def store_async(
+        self,
+        key: str,
+        data: bytes,
+        duration: Optional[float] = None,
+        envelope: Optional[bytes] = None,
+    ):
+        """
+        Write clip to the cache, file I/O runs in the default executor
+
+        Args:
+            key: Key from clip_key()
+            data: Encoded clip
+            duration: Clip duration in seconds
+            envelope: Lip-sync envelope
+        """
+        if key in self._index or key in self._storing:
+            return
+        self._storing.add(key)
+        target = self._path(key)
+        try:
+            loop = asyncio.get_running_loop()
+            if envelope:
+                await loop.run_in_executor(None, self._write_file, self._envelope_path(key), envelope)
+            await loop.run_in_executor(None, self._write_file, target, data)
+        except OSError as e:
+            print(f"⚠ Не удалось сохранить клип в кэш: {e}")
+            return
+        finally:
+            self._storing.discard(key)
+
+        self._index[key] = {
+            'size': len(data),
+            'duration': duration,
+            'envelope': bool(envelope),
+            'last_used': time.time(),
+        }
+        self.total_bytes += len(data)
+
+        victims = self._evict()
+        if victims:
+            await loop.run_in_executor(None, self._discard_all, victims)
+        self._schedule_save()
+
+    def _read_files(self, key: str, with_envelope: bool) -> Tuple[bytes, Optional[bytes]]:
+        """Read clip and its envelope (a missing envelope is not an error)"""
+        with open(self._path(key), 'rb') as f:
+            data = f.read()
+        envelope = None
+        if with_envelope:
+            try:
+                with open(self._envelope_path(key), 'rb') as f:
+                    envelope = f.read()
+            except OSError:
+                pass
+        return data, envelope
+
+    @staticmethod
+    def _write_file(target: Path, data: bytes):
+        """Write file atomically (temp name unique per write)"""
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{uuid.uuid4().hex}.part")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+
+    def _evict(self) -> List[str]:
+        """
+        Drop least recently used clips from the index until within budget
+
+        Returns:
+            Files to delete (the caller decides where the deletion runs)
+        """
+        victims = []
+        if self.total_bytes <= self.max_bytes:
+            return victims
+
+        for key, meta in sorted(self._index.items(), key=lambda item: item[1]['last_used']):
+            if self.total_bytes <= self.max_bytes:
+                break
+            victims += [str(self._path(key)), str(self._envelope_path(key))]
+            self._forget(key)
+        return victims
+
+    def _forget(self, key: str):
+        meta = self._index.pop(key, None)
+        if meta:
+            self.total_bytes -= meta['size']
+
+    @staticmethod
+    def _discard(file_path: str):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    @classmethod
+    def _discard_all(cls, file_paths: List[str]):
+        for file_path in file_paths:
+            cls._discard(file_path)
+
+    def flush(self):
+        """Persist index now (shutdown): pending delayed save and last-use times"""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+        self._save_task = None
+        self._save_index()
@@ -0,0 +1,370 @@
+"""
+Vectorized DSP for voice enhancement (NumPy)
+
+Mirrors the pydub chain in voice_engine.enhance_pydub: pitch shift by
+resampling, peak normalization, dynamic range compression and one-pole
+low/high-pass filters. Recursive filters are applied as an FFT convolution
+with their (truncated) impulse response, the compressor gain is computed at
+1 ms control rate and interpolated to sample rate.
+"""
+import math
+from typing import Tuple
+import numpy as np
+
+# Impulse response is cut once its tail is below this fraction of the peak
+IR_TOLERANCE = 1e-7
+IR_MAX_LENGTH = 1 << 16
+
+
+def segment_to_array(seg) -> np.ndarray:
+    """
+    AudioSegment -> float64 samples shaped (frames, channels)
+
+    Args:
+        seg: pydub AudioSegment
+
+    Returns:
+        Samples in the segment's integer scale
+    """
+    samples = np.array(seg.get_array_of_samples(), dtype=np.float64)
+    return samples.reshape(-1, seg.channels)
+
+
+def array_to_segment(samples: np.ndarray, seg):
+    """
+    Float samples -> AudioSegment with the same format as seg
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        seg: Template AudioSegment (sample width, channels, frame rate)
+
+    Returns:
+        New AudioSegment
+    """
+    max_amp = seg.max_possible_amplitude
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[seg.sample_width]
+    clipped = np.clip(samples, -max_amp, max_amp - 1)
+    return seg._spawn(data=clipped.astype(dtype).tobytes())
+
+
+def resample_linear(samples: np.ndarray, in_rate: int, out_rate: int) -> np.ndarray:
+    """
+    Resample by linear interpolation (same grid as audioop.ratecv)
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        in_rate: Input sample rate
+        out_rate: Output sample rate
+
+    Returns:
+        Resampled samples
+    """
+    frames = samples.shape[0]
+    if frames == 0:
+        return samples
+    step = in_rate / out_rate
+    out_frames = int((frames - 1) // step) + 1
+    positions = np.arange(out_frames) * step
+    source = np.arange(frames)
+    return np.stack(
+        [np.interp(positions, source, samples[:, ch]) for ch in range(samples.shape[1])],
+        axis=1,
+    )
+
+
+def pitch_shift(samples: np.ndarray, frame_rate: int, octaves: float) -> np.ndarray:
+    """
+    Raise pitch (and speed) by playing samples faster, like pydub's frame_rate trick
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        frame_rate: Sample rate
+        octaves: Shift in octaves
+
+    Returns:
+        Shifted samples (shorter for positive shift)
+    """
+    return resample_linear(samples, int(frame_rate * (2.0 ** octaves)), frame_rate)
+
+
+def normalize_peak(samples: np.ndarray, max_amp: float, headroom: float) -> np.ndarray:
+    """
+    Scale samples so the peak sits headroom dB below full scale
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        max_amp: Full scale value
+        headroom: Headroom in dB
+
+    Returns:
+        Normalized samples
+    """
+    peak = np.max(np.abs(samples)) if samples.size else 0.0
+    if peak == 0:
+        return samples
+    target = max_amp * 10 ** (-headroom / 20.0)
+    return samples * (target / peak)
+
+
+def window_rms(samples: np.ndarray, window: int) -> np.ndarray:
+    """
+    RMS over the previous `window` frames (all channels) for every frame
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        window: Window length in frames
+
+    Returns:
+        RMS per frame
+    """
+    squares = np.mean(samples * samples, axis=1)
+    cumsum = np.concatenate(([0.0], np.cumsum(squares)))
+    frames = samples.shape[0]
+    end = np.arange(frames)
+    start = np.maximum(end - window, 0)
+    count = np.maximum(end - start, 1)
+    mean = (cumsum[end] - cumsum[start]) / count
+    return np.sqrt(np.maximum(mean, 0.0))
+
+
+def compress(
+    samples: np.ndarray,
+    frame_rate: int,
+    max_amp: float,
+    threshold: float = -20.0,
+    ratio: float = 4.0,
+    attack: float = 5.0,
+    release: float = 50.0,
+) -> np.ndarray:
+    """
+    Envelope-follower compressor (same parameters as pydub.effects.compress_dynamic_range)
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        frame_rate: Sample rate
+        max_amp: Full scale value
+        threshold: Threshold in dBFS
+        ratio: Compression ratio
+        attack: Attack in ms
+        release: Release in ms
+
+    Returns:
+        Compressed samples
+    """
+    frames = samples.shape[0]
+    if frames == 0:
+        return samples
+
+    thresh_rms = max_amp * 10 ** (threshold / 20.0)
+    attack_frames = max(frame_rate * attack / 1000.0, 1.0)
+    release_frames = max(frame_rate * release / 1000.0, 1.0)
+
+    # Level over threshold in dB, vectorized
+    rms = window_rms(samples, int(attack_frames))
+    with np.errstate(divide='ignore'):
+        over_db = np.where(rms > thresh_rms, 20.0 * np.log10(np.maximum(rms, 1e-12) / thresh_rms), 0.0)
+    max_attenuation = (1.0 - 1.0 / ratio) * over_db
+
+    # Attack/release ramp at 1 ms control rate
+    block = max(int(frame_rate / 1000), 1)
+    control = max_attenuation[::block]
+    above = (rms > thresh_rms)[::block]
+    attack_step = block / attack_frames
+    release_step = block / release_frames
+
+    attenuation = np.empty(len(control))
+    current = 0.0
+    for i in range(len(control)):
+        target = control[i]
+        if above[i] and current <= target:
+            current = min(current + target * attack_step, target)
+        else:
+            current = max(current - target * release_step, 0.0)
+        attenuation[i] = current
+
+    positions = np.arange(len(control)) * block
+    gain_db = np.interp(np.arange(frames), positions, attenuation)
+    gain = 10 ** (-gain_db / 20.0)
+    return samples * gain[:, None]
+
+
+def impulse_response(b: Tuple[float, ...], a: Tuple[float, ...]) -> np.ndarray:
+    """
+    Impulse response of an IIR filter, cut when it has decayed
+
+    Args:
+        b: Numerator coefficients
+        a: Denominator coefficients (a[0] == 1)
+
+    Returns:
+        Truncated impulse response
+    """
+    order = max(len(a), len(b))
+    b = list(b) + [0.0] * (order - len(b))
+    a = list(a) + [0.0] * (order - len(a))
+
+    response = []
+    x_hist = [0.0] * order
+    y_hist = [0.0] * order
+    peak = 0.0
+    quiet = 0
+    for n in range(IR_MAX_LENGTH):
+        x_hist = [1.0 if n == 0 else 0.0] + x_hist[:-1]
+        y = sum(b[k] * x_hist[k] for k in range(order)) - sum(a[k] * y_hist[k - 1] for k in range(1, order))
+        y_hist = [y] + y_hist[:-1]
+        response.append(y)
+
+        peak = max(peak, abs(y))
+        quiet = quiet + 1 if abs(y) < peak * IR_TOLERANCE else 0
+        if n > order and quiet > order:
+            break
+    return np.array(response)
+
+
+def iir_filter(samples: np.ndarray, b: Tuple[float, ...], a: Tuple[float, ...]) -> np.ndarray:
+    """
+    Apply IIR filter as FFT convolution with its truncated impulse response
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        b: Numerator coefficients
+        a: Denominator coefficients (a[0] == 1)
+
+    Returns:
+        Filtered samples
+    """
+    frames = samples.shape[0]
+    if frames == 0:
+        return samples
+    h = impulse_response(b, a)
+    size = 1 << int(math.ceil(math.log2(frames + len(h) - 1)))
+    spectrum = np.fft.rfft(samples, size, axis=0) * np.fft.rfft(h, size)[:, None]
+    return np.fft.irfft(spectrum, size, axis=0)[:frames]
+
+
+def one_pole_lowpass(samples: np.ndarray, frame_rate: int, cutoff: float) -> np.ndarray:
+    """6 dB/octave low-pass (same response as pydub's low_pass_filter)"""
+    rc = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / frame_rate
+    alpha = dt / (rc + dt)
+    return iir_filter(samples, (alpha,), (1.0, -(1.0 - alpha)))
+
+
+def one_pole_highpass(samples: np.ndarray, frame_rate: int, cutoff: float) -> np.ndarray:
+    """6 dB/octave high-pass (same response as pydub's high_pass_filter)"""
+    rc = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / frame_rate
+    alpha = rc / (rc + dt)
+    return iir_filter(samples, (alpha, -alpha), (1.0, -alpha))
+
+
+def biquad_coefficients(kind: str, frame_rate: int, freq: float, q: float = 0.7071, gain_db: float = 0.0):
+    """
+    RBJ cookbook biquad coefficients
+
+    Args:
+        kind: 'lowpass', 'highpass' or 'lowshelf'
+        frame_rate: Sample rate
+        freq: Corner frequency in Hz
+        q: Quality factor
+        gain_db: Shelf gain (lowshelf only)
+
+    Returns:
+        (b, a) normalized so a[0] == 1
+    """
+    w0 = 2 * math.pi * freq / frame_rate
+    cos_w0 = math.cos(w0)
+    alpha = math.sin(w0) / (2 * q)
+
+    if kind == 'lowpass':
+        b = ((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    elif kind == 'highpass':
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+        a = (1 + alpha, -2 * cos_w0, 1 - alpha)
+    elif kind == 'lowshelf':
+        A = 10 ** (gain_db / 40.0)
+        sqrt_a = 2 * math.sqrt(A) * alpha
+        b = (
+            A * ((A + 1) - (A - 1) * cos_w0 + sqrt_a),
+            2 * A * ((A - 1) - (A + 1) * cos_w0),
+            A * ((A + 1) - (A - 1) * cos_w0 - sqrt_a),
+        )
+        a = (
+            (A + 1) + (A - 1) * cos_w0 + sqrt_a,
+            -2 * ((A - 1) + (A + 1) * cos_w0),
+            (A + 1) + (A - 1) * cos_w0 - sqrt_a,
+        )
+    else:
+        raise ValueError(f"Unknown biquad type: {kind}")
+
+    return tuple(x / a[0] for x in b), tuple(x / a[0] for x in a)
+
+
+def biquad(samples: np.ndarray, frame_rate: int, kind: str, freq: float, q: float = 0.7071, gain_db: float = 0.0) -> np.ndarray:
+    """Apply RBJ biquad filter (see biquad_coefficients)"""
+    b, a = biquad_coefficients(kind, frame_rate, freq, q, gain_db)
+    return iir_filter(samples, b, a)
+
+
+def loudness_envelope(samples: np.ndarray, frame_rate: int, max_amp: float, fps: float = 30.0, floor_db: float = -50.0) -> np.ndarray:
+    """
+    Per-video-frame mouth opening from windowed RMS (for lip sync)
+
+    Args:
+        samples: Samples shaped (frames, channels)
+        frame_rate: Sample rate
+        max_amp: Full scale value
+        fps: Envelope frames per second (~33 ms windows at 30)
+        floor_db: Level mapped to a closed mouth
+
+    Returns:
+        uint8 array, 0 (silence) .. 255 (full scale), one value per window
+    """
+    window = max(int(round(frame_rate / fps)), 1)
+    frames = samples.shape[0]
+    count = int(math.ceil(frames / window))
+    if count == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    mono = np.mean(samples, axis=1)
+    padded = np.zeros(count * window)
+    padded[:frames] = mono
+    rms = np.sqrt(np.mean(padded.reshape(count, window) ** 2, axis=1))
+
+    with np.errstate(divide='ignore'):
+        level_db = 20.0 * np.log10(np.maximum(rms, 1e-12) / max_amp)
+    level = np.clip((level_db - floor_db) / -floor_db, 0.0, 1.0)
+    return np.round(level * 255).astype(np.uint8)
+
+
+def enhance_numpy(seg, params: dict):
+    """
+    Voice enhancement chain on NumPy arrays
+
+    Args:
+        seg: Decoded pydub AudioSegment
+        params: voice_engine.ENHANCEMENT_PARAMS
+
+    Returns:
+        Enhanced AudioSegment
+    """
+    max_amp = seg.max_possible_amplitude
+    rate = seg.frame_rate
+
+    samples = segment_to_array(seg)
+    samples = pitch_shift(samples, rate, params['pitch_octaves'])
+    samples = normalize_peak(samples, max_amp, params['headroom'])
+    samples = compress(
+        samples,
+        rate,
+        max_amp,
+        threshold=params['threshold'],
+        ratio=params['ratio'],
+        attack=params['attack'],
+        release=params['release'],
+    )
+    samples = one_pole_lowpass(samples, rate, params['low_pass'])
+    samples = one_pole_highpass(samples, rate, params['high_pass'])
+
+    return array_to_segment(samples, seg)
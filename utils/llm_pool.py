@@ -0,0 +1,372 @@
+"""
+Pool of OpenAI-compatible LLM endpoints with latency tracking, hedging and failover
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible backend with live stats and a circuit breaker
+
+    The breaker opens after circuit_failures consecutive errors. Once
+    circuit_cooldown has passed a single trial request is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str,
+        model: str,
+        small_model: str = None,
+        timeout: float = 15.0,
+        latency_window: int = 50,
+        circuit_failures: int = 3,
+        circuit_cooldown: float = 30.0,
+    ):
+        """
+        Initialize endpoint
+
+        Args:
+            name: Name for logs
+            base_url: API base URL (…/v1)
+            api_key: API key
+            model: Chat model
+            small_model: Cheap model for background jobs (defaults to model)
+            timeout: Seconds before a request fails
+            latency_window: Latencies kept for p95 (per request kind)
+            circuit_failures: Consecutive errors that open the breaker
+            circuit_cooldown: Seconds before a trial request is allowed
+        """
+        self.name = name
+        self.model = model
+        self.small_model = small_model or model
+        self.base_url = base_url
+        self._api_key = api_key
+        self._timeout = timeout
+        self._client = None
+
+        self.circuit_failures = circuit_failures
+        self.circuit_cooldown = circuit_cooldown
+        self.failures = 0  # Consecutive
+        self.open_until = 0.0  # Breaker open while time.time() < open_until
+        self.trial = False  # Half-open trial request in flight
+
+        # Stats, latencies per request kind (see latency_kind)
+        self.latency_window = latency_window
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.ewma: Dict[str, float] = {}
+        self.error_rate = 0.0  # EWMA of 0/1 outcomes
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def client(self):
+        """AsyncOpenAI client, created on first use (importing openai takes ~1s)"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # No client-side retries: the pool fails over to another endpoint instead
+            self._client = AsyncOpenAI(
+                api_key=self._api_key or 'none',
+                base_url=self.base_url,
+                timeout=self._timeout,
+                max_retries=0,
+            )
+        return self._client
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.circuit_failures
+
+    def available(self, now: float) -> bool:
+        """Check if the breaker lets a request through"""
+        if not self.is_open:
+            return True
+        return now >= self.open_until and not self.trial
+
+    @staticmethod
+    def latency_kind(small: bool, stream: bool) -> str:
+        """
+        Latency bucket for a request
+
+        Streamed calls are timed to the response headers, full ones to the
+        last token, and the small model has its own speed: mixing them would
+        make one p95 meaningless for the others.
+        """
+        return f"{'small' if small else 'main'}_{'stream' if stream else 'full'}"
+
+    def p95(self, kind: str) -> Optional[float]:
+        """95th percentile of recent latencies of this kind (None until there are enough samples)"""
+        latencies = self.latencies.get(kind)
+        if latencies is None or len(latencies) < 5:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record_latency(self, kind: str, latency: float, alpha: float = 0.2):
+        """Add latency sample"""
+        latencies = self.latencies.get(kind)
+        if latencies is None:
+            latencies = self.latencies[kind] = deque(maxlen=self.latency_window)
+        latencies.append(latency)
+        ewma = self.ewma.get(kind)
+        self.ewma[kind] = latency if ewma is None else alpha * latency + (1 - alpha) * ewma
+
+    def record_success(self, kind: str, latency: float, alpha: float = 0.2):
+        """Update stats after a successful request"""
+        self.requests += 1
+        self.record_latency(kind, latency, alpha)
+        self.error_rate = (1 - alpha) * self.error_rate
+        if self.is_open:
+            print(f"✓ LLM {self.name}: снова доступен")
+        self.failures = 0
+        self.trial = False
+
+    def record_failure(self, error: Exception, alpha: float = 0.2):
+        """Update stats after a failed request, open the breaker if needed"""
+        self.requests += 1
+        self.errors += 1
+        self.error_rate = alpha + (1 - alpha) * self.error_rate
+        self.failures += 1
+        self.trial = False
+        if self.is_open:
+            self.open_until = time.time() + self.circuit_cooldown
+            print(f"⚠ LLM {self.name}: {self.failures} ошибок подряд ({error}), пауза {self.circuit_cooldown:.0f}s")
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate, 3),
+            'ewma': {kind: round(value, 3) for kind, value in self.ewma.items()},
+            'p95': {kind: round(self.p95(kind), 3) for kind in self.latencies if self.p95(kind) is not None},
+            'open': self.is_open,
+        }
+
+
+class LLMPool:
+    """
+    Sends chat completions to the first healthy endpoint (config order)
+
+    If the primary hasn't answered within its p95 latency the same request
+    is hedged to the next endpoint and the first answer wins. Errors fail
+    over to the next endpoint right away. With stream=True the race is
+    decided by the time to the response headers. Requests for the small
+    model (background jobs) are never hedged, only failed over.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        hedge: bool = True,
+        hedge_delay: float = 2.0,
+        hedge_min_delay: float = 0.3,
+    ):
+        """
+        Initialize pool
+
+        Args:
+            endpoints: Endpoints in priority order
+            hedge: Send a second request when the primary is slow
+            hedge_delay: Hedge delay until the primary has a p95
+            hedge_min_delay: Never hedge earlier than this
+        """
+        if not endpoints:
+            raise ValueError("LLMPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+
+        # Stats
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'LLMPool':
+        """Build pool from config.LLM_ENDPOINTS and LLM_* settings"""
+        endpoints = [
+            Endpoint(
+                name=entry['name'],
+                base_url=entry['base_url'],
+                api_key=entry.get('api_key', ''),
+                model=entry['model'],
+                small_model=entry.get('small_model'),
+                timeout=entry.get('timeout', config.LLM_TIMEOUT),
+                latency_window=config.LLM_LATENCY_WINDOW,
+                circuit_failures=config.LLM_CIRCUIT_FAILURES,
+                circuit_cooldown=config.LLM_CIRCUIT_COOLDOWN,
+            )
+            for entry in config.LLM_ENDPOINTS
+        ]
+        return cls(
+            endpoints,
+            hedge=config.LLM_HEDGE,
+            hedge_delay=config.LLM_HEDGE_DELAY,
+            hedge_min_delay=config.LLM_HEDGE_MIN_DELAY,
+        )
+
+    def _candidates(self) -> List[Endpoint]:
+        now = time.time()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        if not candidates:
+            # Everything is open: try the one that recovers first rather than failing outright
+            candidates = [min(self.endpoints, key=lambda endpoint: endpoint.open_until)]
+        return candidates
+
+    def _hedge_after(self, endpoint: Endpoint, kind: str) -> float:
+        p95 = endpoint.p95(kind)
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_delay)
+
+    async def create(self, small: bool = False, **kwargs) -> Any:
+        """
+        Chat completion through the pool (same arguments as chat.completions.create, minus model)
+
+        Args:
+            small: Use the endpoints' small_model (background work, not hedged)
+
+        Returns:
+            Completion (or AsyncStream with stream=True) from the winning endpoint
+        """
+        self.requests += 1
+        kind = Endpoint.latency_kind(small, bool(kwargs.get('stream')))
+        hedge = self.hedge and not small
+        candidates = self._candidates()
+        pending: Dict[asyncio.Task, Endpoint] = {}
+        errors: List[Exception] = []
+        launched = 0
+        hedged = False
+
+        def launch() -> bool:
+            """Start request on the next candidate, half-open endpoints get one trial at a time"""
+            nonlocal launched
+            while launched < len(candidates):
+                endpoint = candidates[launched]
+                launched += 1
+                if endpoint.is_open:
+                    if endpoint.trial:
+                        continue
+                    endpoint.trial = True
+                pending[asyncio.create_task(self._call(endpoint, small, kind, kwargs))] = endpoint
+                return True
+            return False
+
+        if not launch():
+            raise RuntimeError("Все LLM эндпоинты недоступны")
+        hedge_at = time.perf_counter() + self._hedge_after(candidates[0], kind)
+        try:
+            while pending:
+                timeout = None
+                if hedge and not hedged and launched < len(candidates):
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    slow = next(iter(pending.values()))
+                    if launch():
+                        self.hedged += 1
+                        print(f"⏱ LLM {slow.name} медлит, дублирую запрос в {candidates[launched - 1].name}")
+                    continue
+
+                winner = None
+                for task in done:
+                    endpoint = pending.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = (task.result(), endpoint)
+                    else:
+                        await self._discard(task.result())
+
+                if winner:
+                    result, endpoint = winner
+                    if hedged and endpoint is not candidates[0]:
+                        self.hedge_wins += 1
+                    return result
+
+                if not pending and launch():
+                    self.failovers += 1
+                    print(f"↪ LLM: переключаюсь на {candidates[launched - 1].name} ({errors[-1]})")
+
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def warm_up(self, timeout: float = 10.0) -> Dict[str, Optional[float]]:
+        """
+        Open connections (DNS, TCP, TLS) to all endpoints with a 1-token request
+
+        Clients (and the openai package) are created in a worker thread, so
+        this overlaps with the rest of startup. Not counted in latency stats:
+        the tiny request isn't representative.
+
+        Returns:
+            Seconds per endpoint, None if it failed
+        """
+        async def ping(endpoint: Endpoint) -> Optional[float]:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    endpoint.client.chat.completions.create(
+                        model=endpoint.small_model,
+                        messages=[{'role': 'user', 'content': 'hi'}],
+                        max_tokens=1,
+                    ),
+                    timeout,
+                )
+            except Exception as e:
+                print(f"⚠ LLM {endpoint.name}: прогрев не удался: {e}")
+                return None
+            return time.perf_counter() - started
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: [endpoint.client for endpoint in self.endpoints])
+
+        results = await asyncio.gather(*(ping(endpoint) for endpoint in self.endpoints))
+        return {endpoint.name: result for endpoint, result in zip(self.endpoints, results)}
+
+    async def _call(self, endpoint: Endpoint, small: bool, kind: str, kwargs: dict) -> Any:
+        """Single request with stats"""
+        started = time.perf_counter()
+        try:
+            result = await endpoint.client.chat.completions.create(
+                model=endpoint.small_model if small else endpoint.model,
+                **kwargs,
+            )
+        except asyncio.CancelledError:
+            # Lost the race: elapsed time is a lower bound of its latency, keeps p95 honest
+            endpoint.record_latency(kind, time.perf_counter() - started)
+            endpoint.trial = False
+            raise
+        except Exception as e:
+            endpoint.record_failure(e)
+            raise
+        endpoint.record_success(kind, time.perf_counter() - started)
+        return result
+
+    @staticmethod
+    async def _discard(result: Any):
+        """Close a losing stream"""
+        close = getattr(result, 'close', None)
+        if close:
+            try:
+                await close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'failovers': self.failovers,
+            'endpoints': {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+        }
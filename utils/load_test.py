@@ -0,0 +1,465 @@
+"""
+Load test: push chat through the real ingestion path with stub LLM/TTS
+
+Usage:
+    python utils/load_test.py [--rate 5] [--duration 30] [--shape steady|burst|ramp]
+    python utils/load_test.py --replay chat.txt --rate 20
+    python utils/load_test.py --replay data/app_db.db --speed 10
+
+Messages go through TwitchAIGirl.process_message (filter rules, rate
+limit, duplicates, scheduler, pipeline). AIBrain and VoiceEngine are
+replaced by stubs with configurable latency distributions, the avatar by
+a stub viewer, and the database lives in a temporary directory, so no
+network, API keys or ffmpeg are needed. Prints one JSON report:
+throughput, drops by reason, per-stage p50/p95/p99 latency and event-loop
+lag. With --max-* limits the exit code is 1 when a limit is exceeded (CI).
+
+Latency specs: '0.5' or 'const:0.5', 'uniform:0.2,1.0',
+'lognormal:0.8,0.5' (median seconds, sigma).
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config
+import main as app_main
+from data.db import AppDb
+from utils.mok_chat import MokChatBot
+from voice_engine import AudioClip
+
+JOB_TAG = re.compile(r'^#(\d+) ')
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Latency spec -> sampler of seconds"""
+    kind, _, params = spec.partition(':')
+    if not params:
+        kind, params = 'const', kind
+    values = [float(value) for value in params.split(',')]
+    if kind == 'const':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def percentiles(values: List[float]) -> dict:
+    """p50/p95/p99/max in milliseconds"""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1)
+
+    return {
+        'count': len(ordered),
+        'p50': pick(0.5),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(ordered[-1] * 1000, 1),
+    }
+
+
+class Tracker:
+    """
+    Follows every message through the stages
+
+    The stub brain tags each response with a job id ('#12 ...'); the stub
+    voice and viewer read it back, so clips are matched to messages.
+    """
+
+    def __init__(self):
+        self._received: Dict[Tuple[str, str], deque] = defaultdict(deque)
+        self._ids = itertools.count(1)
+        self.jobs: Dict[int, dict] = {}
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.llm_errors = 0
+
+    def received(self, username: str, message: str):
+        self._received[(username, message)].append(time.time())
+
+    def start_job(self, username: str, message: str) -> int:
+        """Message reached the LLM stage"""
+        now = time.time()
+        queue = self._received.get((username, message))
+        received = queue.popleft() if queue else now
+        job_id = next(self._ids)
+        self.jobs[job_id] = {'received': received, 'first_audio': None, 'played_until': None}
+        self.samples['queue'].append(now - received)
+        return job_id
+
+    def clip_played(self, job_id: int, start: float, end: float):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job['first_audio'] is None:
+            job['first_audio'] = start
+            self.samples['first_audio'].append(start - job['received'])
+        job['played_until'] = end
+
+    def finish(self):
+        """End-to-end latency of every answered message"""
+        for job in self.jobs.values():
+            if job['played_until'] is not None:
+                self.samples['end_to_end'].append(job['played_until'] - job['received'])
+
+    @property
+    def answered(self) -> int:
+        return sum(1 for job in self.jobs.values() if job['first_audio'] is not None)
+
+
+class StubBrain:
+    """AIBrain stand-in: same coroutines, sleeps instead of calling the LLM"""
+
+    def __init__(self, tracker: Tracker, db: AppDb, rng: random.Random, latency, error_rate: float, sentences: int):
+        self.tracker = tracker
+        self.db = db
+        self.rng = rng
+        self.latency = latency
+        self.error_rate = error_rate
+        self.sentences = sentences
+        self.active_users = set()
+
+    async def warm_up(self) -> bool:
+        return True
+
+    def _answer(self, job_id: int, part: int = 0) -> str:
+        return f"#{job_id} ответ часть {part + 1}, чтобы было что озвучить."
+
+    async def _call(self) -> float:
+        seconds = self.latency(self.rng)
+        await asyncio.sleep(seconds)
+        if self.rng.random() < self.error_rate:
+            self.tracker.llm_errors += 1
+            raise RuntimeError("stub LLM error")
+        self.tracker.samples['llm'].append(seconds)
+        return seconds
+
+    async def get_response(self, username: str, message: str) -> str:
+        job_id = self.tracker.start_job(username, message)
+        self.db.add_message(app_main.UserMessage(username=username, text=message))
+        await self._call()
+        return self._answer(job_id)
+
+    async def get_batch_responses(self, items: List[Tuple[str, str]]) -> List[str]:
+        job_ids = [self.tracker.start_job(username, message) for username, message in items]
+        for username, message in items:
+            self.db.add_message(app_main.UserMessage(username=username, text=message))
+        await self._call()
+        return [self._answer(job_id) for job_id in job_ids]
+
+    async def stream_response(self, username: str, message: str) -> AsyncIterator[str]:
+        job_id = self.tracker.start_job(username, message)
+        self.db.add_message(app_main.UserMessage(username=username, text=message))
+        started = time.time()
+        seconds = self.latency(self.rng)
+        for part in range(self.sentences):
+            # Sentences finish evenly over the sampled generation time
+            await asyncio.sleep(max(0.0, started + seconds * (part + 1) / self.sentences - time.time()))
+            if part == 0 and self.rng.random() < self.error_rate:
+                self.tracker.llm_errors += 1
+                raise RuntimeError("stub LLM error")
+            yield self._answer(job_id, part)
+        self.tracker.samples['llm'].append(seconds)
+
+
+class StubVoice:
+    """VoiceEngine stand-in: sleeps for the TTS latency, returns a silent clip"""
+
+    def __init__(self, tracker: Tracker, rng: random.Random, latency, clip_seconds):
+        self.tracker = tracker
+        self.rng = rng
+        self.latency = latency
+        self.clip_seconds = clip_seconds
+        self.audio_pool = None
+
+    async def warm_up(self):
+        pass
+
+    async def synthesize(self, text: str) -> Optional[AudioClip]:
+        seconds = self.latency(self.rng)
+        await asyncio.sleep(seconds)
+        self.tracker.samples['tts'].append(seconds)
+        match = JOB_TAG.match(text)
+        return AudioClip(data=match.group(1).encode() if match else b'0', duration=self.clip_seconds(self.rng), text=text)
+
+    def stop(self):
+        pass
+
+
+class StubViewer:
+    """Browser stand-in: clips queue up and play back to back"""
+
+    def __init__(self, tracker: Tracker):
+        self.tracker = tracker
+        self.playing_until = 0.0
+
+    async def play_audio_bytes(self, data: bytes, duration: float, envelope: Optional[bytes] = None):
+        start = max(time.time(), self.playing_until)
+        self.playing_until = start + duration
+        self.tracker.clip_played(int(data), start, self.playing_until)
+
+
+class StubAvatar:
+    """AvatarAnimator stand-in"""
+
+    def __init__(self, tracker: Tracker):
+        self.is_talking = False
+        self.vrm_controller = StubViewer(tracker)
+
+    async def start_talking(self):
+        self.is_talking = True
+
+    async def stop_talking(self):
+        self.is_talking = False
+
+    async def stop(self):
+        pass
+
+
+WORDS = (
+    "привет как дела стрим игра музыка кот собака погода вечер утро аниме фильм книга работа "
+    "школа пицца кофе чай спорт футбол танцы песня голос донат вопрос босс уровень"
+).split()
+
+
+def synthetic_chat(users: int, rng: random.Random) -> Iterator[Tuple[str, str]]:
+    """Endless random chat: some questions, some mentions of the character"""
+    while True:
+        words = rng.choices(WORDS, k=rng.randint(3, 9))
+        if rng.random() < 0.2:
+            words.insert(0, config.CHARACTER_NAME)
+        text = ' '.join(words) + ('?' if rng.random() < 0.4 else '')
+        yield f"viewer{rng.randrange(users)}", text
+
+
+def replay_file(path: str) -> Tuple[List[Tuple[str, str]], Optional[List[float]]]:
+    """
+    Load recorded chat
+
+    Returns:
+        (messages, offsets in seconds from the first message or None)
+    """
+    if path.endswith('.db'):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        rows = conn.execute('SELECT username, message_text, timestamp FROM user_messages ORDER BY rowid').fetchall()
+        conn.close()
+        times = [
+            ts / 1000 if isinstance(ts, (int, float)) else datetime.fromisoformat(ts).timestamp()
+            for _, _, ts in rows
+        ]
+        return [(username, text) for username, text, _ in rows], [t - times[0] for t in times] if times else []
+
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parsed = MokChatBot.parse_line(line.strip())
+            if parsed:
+                messages.append(parsed)
+    return messages, None
+
+
+def rate_at(t: float, args) -> float:
+    """Messages per second at t seconds into the run"""
+    if args.shape == 'burst':
+        return args.rate * args.burst_factor if t % args.burst_every < args.burst_length else args.rate
+    if args.shape == 'ramp':
+        return args.rate + (args.rate * args.burst_factor - args.rate) * min(1.0, t / args.duration)
+    return args.rate
+
+
+def arrivals(args, rng: random.Random) -> Iterator[Tuple[float, str, str]]:
+    """(offset seconds, username, message) in arrival order"""
+    if args.replay:
+        messages, offsets = replay_file(args.replay)
+        if offsets is not None:
+            for offset, (username, message) in zip(offsets, messages):
+                yield offset / args.speed, username, message
+            return
+        source = iter(messages)
+    else:
+        source = synthetic_chat(args.users, rng)
+
+    t = 0.0
+    for username, message in source:
+        # Poisson arrivals at the current rate
+        t += rng.expovariate(rate_at(t, args))
+        if t > args.duration:
+            return
+        yield t, username, message
+
+
+async def measure_loop_lag(samples: List[float], interval: float = 0.01):
+    """Record how late the event loop wakes a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def run(args, workdir: str) -> dict:
+    rng = random.Random(args.seed)
+    tracker = Tracker()
+    db = AppDb(os.path.join(workdir, 'load.db'))
+
+    skipped = defaultdict(int)
+    add_skipped = db.add_skipped_message
+
+    def count_skipped(message, reason):
+        skipped[reason] += 1
+        add_skipped(message, reason)
+
+    db.add_skipped_message = count_skipped
+
+    config.STREAM_RESPONSES = not args.no_stream
+    config.BATCH_ENABLED = not args.no_batch
+
+    brain = StubBrain(tracker, db, rng, parse_latency(args.llm_latency), args.llm_error_rate, args.sentences)
+    voice = StubVoice(tracker, rng, parse_latency(args.tts_latency), parse_latency(args.clip_seconds))
+    avatar = StubAvatar(tracker)
+    app_main.AIBrain = lambda: brain
+    app_main.VoiceEngine = lambda: voice
+    app_main.AvatarAnimator = lambda: avatar
+    app = app_main.TwitchAIGirl('load_test')
+
+    lag: List[float] = []
+    lag_task = asyncio.create_task(measure_loop_lag(lag))
+    app.pipeline.start()
+    app.scheduler_task = asyncio.create_task(app.scheduler.run(app.pipeline))
+
+    injected = 0
+    started = time.time()
+    for offset, username, message in arrivals(args, rng):
+        delay = started + offset - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tracker.received(username, message)
+        await app.process_message(username, message)
+        injected += 1
+    injected_for = time.time() - started
+
+    # Drain: let buffered messages be answered
+    deadline = time.time() + args.drain
+    while (app.pipeline.in_flight or len(app.scheduler)) and time.time() < deadline:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(max(0.0, avatar.vrm_controller.playing_until - time.time()))
+    elapsed = time.time() - started
+
+    app.scheduler_task.cancel()
+    lag_task.cancel()
+    await app.pipeline.stop()
+    db.close()
+    tracker.finish()
+
+    dropped = sum(skipped.values())
+    return {
+        'settings': {
+            'source': args.replay or f"synthetic ({args.users} users)",
+            'shape': args.shape if not args.replay else 'replay',
+            'rate': args.rate,
+            'stream': config.STREAM_RESPONSES,
+            'batch': config.BATCH_ENABLED,
+            'llm_latency': args.llm_latency,
+            'tts_latency': args.tts_latency,
+            'clip_seconds': args.clip_seconds,
+        },
+        'injected': injected,
+        'answered': tracker.answered,
+        'unanswered': injected - tracker.answered - dropped,
+        'dropped': dict(skipped),
+        'drop_rate': round(dropped / injected, 4) if injected else 0,
+        'llm_errors': tracker.llm_errors,
+        'elapsed_s': round(elapsed, 2),
+        'ingest_per_s': round(injected / injected_for, 2) if injected_for else 0,
+        'answered_per_s': round(tracker.answered / elapsed, 3) if elapsed else 0,
+        'latency_ms': {stage: percentiles(tracker.samples[stage]) for stage in
+                       ('queue', 'llm', 'tts', 'first_audio', 'end_to_end')},
+        'loop_lag_ms': percentiles(lag),
+        'filter': app.message_filter.stats(),
+        'scheduler': {
+            'received': app.scheduler.received,
+            'dispatched': app.scheduler.dispatched,
+            'evicted': app.scheduler.evicted,
+            'expired': app.scheduler.expired,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replay', help="chat.txt-style file or app database (.db, replayed with its timing)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed-up for .db timing")
+    parser.add_argument('--rate', type=float, default=5.0, help="Messages per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of injected chat")
+    parser.add_argument('--shape', choices=('steady', 'burst', 'ramp'), default='steady')
+    parser.add_argument('--burst-factor', type=float, default=10.0, help="Rate multiplier in bursts / at ramp end")
+    parser.add_argument('--burst-every', type=float, default=10.0, help="Seconds between burst starts")
+    parser.add_argument('--burst-length', type=float, default=2.0, help="Seconds per burst")
+    parser.add_argument('--users', type=int, default=200, help="Synthetic chatters")
+    parser.add_argument('--llm-latency', default='lognormal:0.8,0.4')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--sentences', type=int, default=2, help="Sentences per streamed answer")
+    parser.add_argument('--tts-latency', default='uniform:0.2,0.5')
+    parser.add_argument('--clip-seconds', default='uniform:1.5,3.0', help="Duration of each spoken clip")
+    parser.add_argument('--no-stream', action='store_true', help="Answer with one clip instead of per sentence")
+    parser.add_argument('--no-batch', action='store_true', help="Never batch buffered messages")
+    parser.add_argument('--drain', type=float, default=30.0, help="Max seconds to wait for buffered answers")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Also write the report to this file")
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's console output")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary DB, vector index and archive")
+    parser.add_argument('--max-e2e-p95', type=float, help="Fail if end-to-end p95 exceeds this (ms)")
+    parser.add_argument('--max-loop-lag-p99', type=float, help="Fail if event-loop lag p99 exceeds this (ms)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='twitch_ai_load_')
+    try:
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+                report = asyncio.run(run(args, workdir))
+    finally:
+        if args.keep:
+            print(f"Artifacts kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+    failed = False
+    if args.max_e2e_p95 is not None and report['latency_ms']['end_to_end'].get('p95', 0) > args.max_e2e_p95:
+        print(f"end-to-end p95 above {args.max_e2e_p95} ms", file=sys.stderr)
+        failed = True
+    if args.max_loop_lag_p99 is not None and report['loop_lag_ms'].get('p99', 0) > args.max_loop_lag_p99:
+        print(f"event-loop lag p99 above {args.max_loop_lag_p99} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,173 @@
 import re
-from config import BANNED_WORDS_FILE
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+from config import (
+    BANNED_WORDS_FILE, FILTER_MAX_LENGTH, FILTER_CAPS_RATIO,
+    FILTER_CAPS_MIN_LENGTH, FILTER_MAX_REPEAT, IGNORE_USERS,
+    RATE_LIMIT_ENABLED, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST, RATE_LIMIT_USERS,
+    DUPLICATE_ENABLED, DUPLICATE_WINDOW, DUPLICATE_THRESHOLD, DUPLICATE_MIN_LENGTH,
+)
+from utils.spam_guard import NearDuplicateDetector, TokenBucketLimiter
+from utils.word_matcher import WordMatcher
+
+
+@dataclass
+class FilterRule:
+    """Правило фильтра: check(username, message) -> True, если сообщение нужно пропустить"""
+    name: str
+    check: Callable[[str, str], bool]
+    cost: int = 0  # Порядок проверки: дешевые правила раньше
+    hits: int = 0
+    calls: int = 0
+    seconds: float = 0.0
+
 
 class MessageFilter:
+    """
+    Конвейер правил фильтрации чата
+
+    Правила проверяются от дешевых к дорогим, первое сработавшее решает
+    (остальные не выполняются). Для каждого правила считаются вызовы,
+    срабатывания и суммарное время - stats() показывает, что дорого
+    обходится во время рейда. Свои правила добавляются через add_rule().
+    """
+
     def __init__(self):
         self.bad_words = self._load_bad_words()
         self.ignore_users = self._load_ignore_users()
-        print(self.bad_words)
-        print(BANNED_WORDS_FILE)
+        print(f"✓ Фильтр: {len(self.bad_words)} запрещенных слов ({BANNED_WORDS_FILE})")
+
+        # Регулярка компилируется один раз: FILTER_MAX_REPEAT+ одинаковых символов подряд
+        self._repeat = re.compile(r'(.)\1{%d,}' % (FILTER_MAX_REPEAT - 1))
+
+        self.rules: List[FilterRule] = []
+        self.add_rule('empty', lambda username, message: not message.strip(), cost=0)
+        self.add_rule('ignored_user', lambda username, message: username.lower() in self.ignore_users, cost=1)
+        self.add_rule('too_long', lambda username, message: len(message) > FILTER_MAX_LENGTH, cost=2)
+        self.add_rule('caps', self._is_caps, cost=3)
+        self.add_rule('repeated_chars', lambda username, message: self._repeat.search(message) is not None, cost=4)
+        self.add_rule('bad_word', lambda username, message: self.bad_words.find(message) is not None, cost=5)
+        
+        # Состояние между сообщениями: лимит на зрителя и недавние сообщения для поиска копипасты
+        self.rate_limiter = None
+        if RATE_LIMIT_ENABLED:
+            self.rate_limiter = TokenBucketLimiter(RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST, RATE_LIMIT_USERS)
+            # После правил по содержимому: лимит тратят только сообщения, которые иначе дошли бы до очереди
+            self.add_rule('rate_limit', lambda username, message: not self.rate_limiter.allow(username), cost=99)
+        self.duplicates = None
+        if DUPLICATE_ENABLED:
+            self.duplicates = NearDuplicateDetector(DUPLICATE_WINDOW, DUPLICATE_THRESHOLD, DUPLICATE_MIN_LENGTH)
+            # Последним: запоминаются только сообщения, прошедшие остальные правила
+            self.add_rule('duplicate', lambda username, message: self.duplicates.is_duplicate(message), cost=100)
 
-    def _load_bad_words(self):
-        """Загружает плохие слова из файла или базы"""
+    def _load_bad_words(self) -> WordMatcher:
+        """Загружает плохие слова из файла (через пробел или по строке, # - комментарий, 'основа*' - любое окончание) в автомат"""
+        words = []
         with open(BANNED_WORDS_FILE, 'r', encoding='utf-8') as f:
-            words = f.read().split(' ')
-        return words
-    
-    def _load_ignore_users(self):
-        return []
-    
+            for line in f:
+                if not line.lstrip().startswith('#'):
+                    words.extend(line.split())
+        return WordMatcher(words)
+
+    def _load_ignore_users(self) -> set:
+        """Черный список (IGNORE_USERS в .env), имена в нижнем регистре"""
+        return {username.lower() for username in IGNORE_USERS}
+
+    def add_rule(self, name: str, check: Callable[[str, str], bool], cost: int = 10) -> FilterRule:
+        """
+        Добавить правило
+
+        Args:
+            name: Имя (причина пропуска в логе и stats())
+            check: (username, message) -> True, если сообщение пропустить
+            cost: Порядок проверки, правила с равным cost - в порядке добавления
+
+        Returns:
+            Добавленное правило
+        """
+        rule = FilterRule(name, check, cost)
+        self.rules.append(rule)
+        self.rules.sort(key=lambda item: item.cost)
+        return rule
+
+    @staticmethod
+    def _is_caps(username: str, message: str) -> bool:
+        """CAPS LOCK: больше FILTER_CAPS_RATIO заглавных среди букв"""
+        if len(message) <= FILTER_CAPS_MIN_LENGTH or message.islower():
+            return False
+        letters = [char for char in message if char.isalpha()]
+        if not letters:
+            return False
+        upper = sum(1 for char in letters if char.isupper())
+        return upper > len(letters) * FILTER_CAPS_RATIO
+
+    def check(self, username: str, message: str) -> Optional[str]:
+        """
+        Проверить одно сообщение
+
+        Returns:
+            Имя сработавшего правила или None, если сообщение проходит
+        """
+        return self.filter_batch([(username, message)])[0]
+
+    def filter_batch(self, messages: Iterable[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Проверить пачку сообщений за один проход
+
+        Каждое правило прогоняется по всем еще не отсеянным сообщениям
+        пачки, время замеряется один раз на правило.
+
+        Args:
+            messages: [(username, message)]
+
+        Returns:
+            Для каждого сообщения имя сработавшего правила или None
+        """
+        messages = list(messages)
+        reasons: List[Optional[str]] = [None] * len(messages)
+        remaining = list(range(len(messages)))
+
+        for rule in self.rules:
+            if not remaining:
+                break
+            started = time.perf_counter()
+            kept = []
+            for i in remaining:
+                username, message = messages[i]
+                if rule.check(username, message):
+                    reasons[i] = rule.name
+                else:
+                    kept.append(i)
+            rule.seconds += time.perf_counter() - started
+            rule.calls += len(remaining)
+            rule.hits += len(remaining) - len(kept)
+            remaining = kept
+
+        return reasons
+
     def should_ignore_message(self, username: str, message: str) -> bool:
         """Расширенная проверка сообщения"""
-        message_lower = message.lower().strip().split(' ')
-        
-        # Проверка плохих слов
-        if any(bad_word in message_lower for bad_word in self.bad_words):
-            print(f"🚫 Фильтр: плохое слово от {username}")
-            return True
-        
-        # Проверка пользователей в черном списке
-        if username.lower() in [user.lower() for user in self.ignore_users]:
-            pass 
-        
-        # Проверка на CAPS LOCK (более 70% заглавных букв)
-        if len(message) > 10:
-            pass 
-        
-        # Проверка на повторяющиеся символы (спам)
-        if re.search(r'(.)\1{5,}', message):  # 6+ одинаковых символов подряд
-            pass 
-        
-        # Проверка длины сообщения
-        if len(message) > 250:
-            print(f"🚫 Фильтр: слишком длинное сообщение от {username}")
-            return True
-        
-        # Проверка на пустое сообщение
-        if not message_lower:
-            return True
-        
-        return False
- 
+        reason = self.check(username, message)
+        if reason:
+            print(f"🚫 Фильтр ({reason}): {username}")
+        return reason is not None
+
     def add_ignore_user(self, username: str):
-        pass 
\ No newline at end of file
+        """Добавить пользователя в черный список"""
+        self.ignore_users.add(username.lower())
+
+    def remove_ignore_user(self, username: str):
+        """Убрать пользователя из черного списка"""
+        self.ignore_users.discard(username.lower())
+
+    def stats(self) -> dict:
+        """Срабатывания и время по правилам (мкс на проверку)"""
+        return {
+            rule.name: {
+                'hits': rule.hits,
+                'calls': rule.calls,
+                'us_per_call': round(rule.seconds / rule.calls * 1e6, 1) if rule.calls else 0,
+            }
+            for rule in self.rules
+        }
@@ -1,55 +1,124 @@
 import asyncio
 import os
-from typing import Callable, Union
+import stat
+import sys
+from typing import Awaitable, Callable, List, Optional, Tuple, Union
 
 class MokChatBot:
-    def __init__(self, path: str, message_callback: Callable[[str, str], None]):
+    """
+    Чат из файла для работы без Twitch
+
+    Обычный файл читается как tail -f: запоминается смещение и читаются
+    только дописанные байты; при обрезании или замене файла (другой inode)
+    чтение начинается сначала. Именованный канал (mkfifo) и stdin ('-')
+    читаются потоком, без опроса. Повторяющиеся сообщения не отбрасываются.
+    """
+
+    READ_CHUNK = 64 * 1024
+    MAX_READ = 1024 * 1024  # Большой дописанный кусок читается частями
+
+    def __init__(
+        self,
+        path: str,
+        message_callback: Callable[[str, str], None],
+        batch_callback: Optional[Callable[[List[Tuple[str, str]]], Awaitable[None]]] = None,
+        poll_interval: float = 0.5,
+    ):
         self.path = path
         self.message_callback = message_callback
+        self.batch_callback = batch_callback  # Получает все прочитанные за раз сообщения одним вызовом
+        self.poll_interval = poll_interval
         self.is_running = False
-        self.last_mtime = 0
-        self.processed_messages = set()
+        self.ready = asyncio.Event()  # Источник открыт
+
+        # Состояние хвоста обычного файла
+        self._offset = 0
+        self._inode = None
+        self._partial = b''  # Недописанная последняя строка
+
+        # Статистика
+        self.lines_read = 0
+
+    def _is_stream(self) -> bool:
+        if self.path == '-':
+            return True
+        try:
+            return stat.S_ISFIFO(os.stat(self.path).st_mode)
+        except OSError:
+            return False
 
     def get_new_messages(self) -> list:
-        """Читает новые сообщения из файла"""
+        """Читает строки, дописанные в файл с прошлого вызова (не больше MAX_READ байт за раз)"""
         try:
-            current_mtime = os.path.getmtime(self.path)
-            
-            if current_mtime <= self.last_mtime:
-                return []
-            
-            self.last_mtime = current_mtime
-            
-            with open(self.path, 'r', encoding='utf-8') as file:
-                all_messages = file.readlines()
-            
-            return [msg.strip() for msg in all_messages if msg.strip()]
-            
-        except Exception as e:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        except OSError as e:
             print(f"❌ Ошибка чтения файла: {e}")
             return []
 
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # Файл заменен или обрезан: читаем новый с начала
+            if self._inode is not None:
+                print(f"↺ Файл чата {self.path} пересоздан, читаю с начала")
+            self._inode = st.st_ino
+            self._offset = 0
+            self._partial = b''
+        if st.st_size == self._offset:
+            return []
+
+        try:
+            with open(self.path, 'rb') as file:
+                file.seek(self._offset)
+                data = file.read(self.MAX_READ)
+        except OSError as e:
+            print(f"❌ Ошибка чтения файла: {e}")
+            return []
+
+        self._offset += len(data)
+        return self._split_lines(data)
+
+    def _split_lines(self, data: bytes) -> List[str]:
+        """Полные строки из data, хвост без перевода строки ждет следующего чтения"""
+        data = self._partial + data
+        *lines, self._partial = data.split(b'\n')
+        self.lines_read += len(lines)
+        return [line.decode('utf-8', errors='replace').strip() for line in lines]
+
+    @staticmethod
+    def parse_line(line: str) -> Optional[Tuple[str, str]]:
+        """'username: сообщение' -> (username, сообщение); комментарии и пустые строки -> None"""
+        if not line or line.startswith('#'):
+            return None
+        if ':' in line:
+            username, text = line.split(':', 1)
+            username = username.strip()
+            text = text.strip()
+        else:
+            username = "user"
+            text = line
+        return (username, text) if text else None
+
     async def process_messages(self, messages: list):
         """Асинхронно обрабатывает сообщения"""
-        for message in messages:
-            if message and not message.startswith('#'):
-                msg_hash = hash(message)
-                
-                if msg_hash not in self.processed_messages:
-                    self.processed_messages.add(msg_hash)
-                    
-                    if ':' in message:
-                        username, text = message.split(':', 1)
-                        username = username.strip()
-                        text = text.strip()
-                    else:
-                        username = "user"
-                        text = message
-                    
-                    if text:
-                        print(f"💬 [{username}]: {text}")
-                        # Асинхронный вызов callback
-                        await self._call_callback(username, text)
+        batch = []
+        for line in messages:
+            parsed = self.parse_line(line)
+            if parsed is None:
+                continue
+            username, text = parsed
+            print(f"💬 [{username}]: {text}")
+            if self.batch_callback:
+                batch.append(parsed)
+            else:
+                # Асинхронный вызов callback
+                await self._call_callback(username, text)
+
+        if batch:
+            try:
+                await self.batch_callback(batch)
+            except Exception as e:
+                print(f"❌ Ошибка в callback: {e}")
 
     async def _call_callback(self, username: str, text: str):
         """Асинхронно вызывает callback"""
@@ -69,46 +138,95 @@ class MokChatBot:
     async def start(self):
         """Запускает бота"""
         self.is_running = True
+        try:
+            if self._is_stream():
+                await self._follow_stream()
+            else:
+                await self._follow_file()
+        except KeyboardInterrupt:
+            print("\n🛑 Остановка мок-бота...")
+        except Exception as e:
+            print(f"❌ Ошибка в мок-боте: {e}")
+        finally:
+            self.is_running = False
+
+    async def _follow_file(self):
+        """Опрашивает обычный файл и читает только дописанное"""
         if os.path.exists(self.path):
             os.remove(self.path)
         with open(self.path, 'w', encoding='utf-8') as f:
             f.write("# Файл чата\n# Формат: username: сообщение\n\n")
-                
+
         print(f"📖 Мок-бот запущен. Чтение из: {self.path}")
         print("💡 Добавляйте сообщения в файл в реальном времени!")
-        
+
+        # Заголовок пропускаем
+        st = os.stat(self.path)
+        self._inode, self._offset = st.st_ino, st.st_size
+        self.ready.set()
+
+        while self.is_running:
+            messages = self.get_new_messages()
+            if messages:
+                await self.process_messages(messages)
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _follow_stream(self):
+        """Читает именованный канал или stdin потоком, без опроса"""
+        loop = asyncio.get_running_loop()
+        if self.path == '-':
+            source, pipe = 'stdin', sys.stdin.buffer
+        else:
+            # O_RDWR: сами держим канал открытым на запись, поэтому уход писателя - не EOF,
+            # и open не ждет появления писателя
+            source = self.path
+            pipe = os.fdopen(os.open(self.path, os.O_RDWR | os.O_NONBLOCK), 'rb', buffering=0)
+
+        reader = asyncio.StreamReader(limit=self.READ_CHUNK)
+        transport = None
         try:
-            self.last_mtime = os.path.getmtime(self.path)
-        except:
-            self.last_mtime = 0
-        
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            read = lambda: reader.read(self.READ_CHUNK)
+        except ValueError:
+            # stdin перенаправлен из обычного файла: читаем в пуле потоков
+            read = lambda: loop.run_in_executor(None, pipe.read1, self.READ_CHUNK)
+        print(f"📖 Мок-бот запущен. Чтение из: {source}")
+        self.ready.set()
         try:
             while self.is_running:
-                messages = self.get_new_messages()
+                data = await read()
+                if not data:
+                    print(f"📭 {source} закрыт")
+                    break
+                messages = self._split_lines(data)
                 if messages:
                     await self.process_messages(messages)
-                await asyncio.sleep(0.5)
-        except KeyboardInterrupt:
-            print("\n🛑 Остановка мок-бота...")
-        except Exception as e:
-            print(f"❌ Ошибка в мок-боте: {e}")
+            if self._partial:
+                await self.process_messages(self._split_lines(b'\n'))
         finally:
-            self.is_running = False
+            if transport:
+                transport.close()
 
     def stop(self):
         """Останавливает бота"""
         self.is_running = False
 
-async def start_mok_bot(message_callback: Callable[[str, str], None], path: str = 'chat.txt') -> MokChatBot:
+async def start_mok_bot(
+    message_callback: Callable[[str, str], None],
+    path: str = 'chat.txt',
+    batch_callback: Optional[Callable[[List[Tuple[str, str]]], Awaitable[None]]] = None,
+) -> MokChatBot:
     """
     Запускает мок-бота
-    
+
     Args:
         message_callback: Функция для обработки сообщений (может быть async или sync)
-        path: Путь к файлу с сообщениями
-        
+        path: Путь к файлу с сообщениями, именованному каналу или '-' для stdin
+        batch_callback: Функция для пачки новых сообщений [(username, text)] (необязательно)
+
     Returns:
         MokChatBot instance
     """
-    bot = MokChatBot(path, message_callback)
-    return bot
\ No newline at end of file
+    bot = MokChatBot(path, message_callback, batch_callback)
+    return bot
@@ -0,0 +1,125 @@
+"""
+Token-budgeted prompt assembly for the chat model
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Words, numbers and single punctuation marks
+TOKEN_PIECE = re.compile(r'\w+|[^\w\s]', re.UNICODE)
+
+# Chat format overhead per message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate BPE token count without loading a tokenizer
+
+    Latin words average ~4 characters per token, Cyrillic ones split
+    about twice as often; punctuation is one token each.
+
+    Args:
+        text: Message text
+
+    Returns:
+        Estimated token count
+    """
+    tokens = 0
+    for piece in TOKEN_PIECE.findall(text):
+        if len(piece) == 1:
+            tokens += 1
+        elif piece.isascii():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += math.ceil(len(piece) / 2.5)
+    return tokens
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """Estimated tokens of a chat message including format overhead"""
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+class PromptBuilder:
+    """
+    Fills a token budget with prompt messages by priority
+
+    Priority: system prompt, current message, user's memory digest, the same
+    user's recent lines, other chat context (newest first). The result keeps
+    chat order.
+    """
+
+    def __init__(self, budget: int):
+        """
+        Initialize builder
+
+        Args:
+            budget: Max prompt tokens
+        """
+        self.budget = budget
+
+        # Stats
+        self.requests = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+
+    def build(
+        self,
+        system: Dict[str, str],
+        current: Dict[str, str],
+        user_lines: Sequence[Dict[str, str]] = (),
+        context: Sequence[Dict[str, str]] = (),
+        memory: Optional[Dict[str, str]] = None,
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Assemble prompt
+
+        Args:
+            system: System prompt message (always included)
+            current: Message being answered (always included)
+            user_lines: Sender's earlier messages, oldest first
+            context: Other conversation messages, oldest first
+            memory: Digest of the sender's older messages (system message)
+
+        Returns:
+            (messages, estimated prompt tokens)
+        """
+        used = message_tokens(system) + message_tokens(current)
+
+        header = [system]
+        if memory and used + message_tokens(memory) <= self.budget:
+            header.append(memory)
+            used += message_tokens(memory)
+
+        chosen_lines, used = self._fill(user_lines, used)
+        chosen_context, used = self._fill(context, used)
+
+        self.requests += 1
+        self.total_tokens += used
+        self.max_tokens = max(self.max_tokens, used)
+
+        return header + chosen_lines + chosen_context + [current], used
+
+    def _fill(self, messages: Sequence[Dict[str, str]], used: int) -> Tuple[List[Dict[str, str]], int]:
+        """Take newest messages while they fit, return them oldest first"""
+        chosen = []
+        for message in reversed(messages):
+            tokens = message_tokens(message)
+            if used + tokens > self.budget:
+                break
+            chosen.append(message)
+            used += tokens
+        chosen.reverse()
+        return chosen, used
+
+    def stats(self) -> dict:
+        """Prompt size over all requests (tokens)"""
+        return {
+            'requests': self.requests,
+            'avg_tokens': self.total_tokens / self.requests if self.requests else 0,
+            'max_tokens': self.max_tokens,
+            'budget': self.budget,
+        }
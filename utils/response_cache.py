@@ -0,0 +1,206 @@
+"""
+Response cache for repeated chat questions ("привет", "как дела", ...)
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Everything except letters, digits and spaces (punctuation, emoji, symbols)
+_NON_WORD = re.compile(r'[^\w\s]|_', re.UNICODE)
+_SPACES = re.compile(r'\s+')
+
+USERNAME_PLACEHOLDER = '{username}'
+
+# Shorter names ("ann", "max") are ordinary words too often to be templatized
+MIN_TEMPLATE_USERNAME_LENGTH = 4
+
+
+def normalize_message(text: str) -> str:
+    """
+    Normalize chat message for cache lookup
+
+    Lowercase, fold ё -> е, strip punctuation/emoji, collapse whitespace.
+    """
+    text = text.lower().replace('ё', 'е')
+    text = _NON_WORD.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+@dataclass
+class CacheEntry:
+    """Cached answers for one normalized message"""
+    variants: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    lookups: int = 0
+    hits: int = 0
+    next_variant: int = 0
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of AI responses keyed by normalized message
+
+    Every key keeps a few answer variants. Until the set is full, every other
+    lookup is reported as a miss so the caller collects one more variant.
+    Concurrent misses for the same key share one in-flight computation
+    via begin() / wait() / finish().
+
+    The asker's name is replaced by a placeholder only where it is a whole
+    word; answers that use a name too short to replace safely are not
+    cached, since the template is served to every other user.
+    """
+
+    def __init__(self, max_size: int, ttl: float, max_variants: int, max_key_length: int):
+        """
+        Initialize cache
+
+        Args:
+            max_size: Max number of keys (least recently used is evicted)
+            ttl: Seconds an entry lives after creation
+            max_variants: Max different answers stored per key
+            max_key_length: Longer messages are not cached (too specific)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_variants = max_variants
+        self.max_key_length = max_key_length
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def make_key(self, message: str) -> Optional[str]:
+        """Return cache key for message, or None if it shouldn't be cached"""
+        key = normalize_message(message)
+        if not key or len(key) > self.max_key_length:
+            return None
+        return key
+
+    def get(self, key: str, username: str) -> Optional[str]:
+        """
+        Get cached answer
+
+        Args:
+            key: Key from make_key()
+            username: Username to put into the answer
+
+        Returns:
+            Answer or None on miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if time.time() - entry.created_at > self.ttl:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        entry.lookups += 1
+
+        # Collect more variants before serving the same few answers
+        if len(entry.variants) < self.max_variants and entry.lookups % 2 == 1:
+            self.misses += 1
+            return None
+
+        variant = entry.variants[entry.next_variant % len(entry.variants)]
+        entry.next_variant += 1
+        entry.hits += 1
+        self.hits += 1
+        return variant.replace(USERNAME_PLACEHOLDER, username)
+
+    @staticmethod
+    def make_template(username: str, response: str) -> Optional[str]:
+        """
+        Replace whole-word mentions of username with the placeholder
+
+        Returns:
+            Template, or None if the answer names a user too short to replace safely
+        """
+        if not username:
+            return response
+        pattern = re.compile(rf'(?<!\w){re.escape(username)}(?!\w)', re.IGNORECASE)
+        if not pattern.search(response):
+            return response
+        if len(username) < MIN_TEMPLATE_USERNAME_LENGTH:
+            return None
+        return pattern.sub(USERNAME_PLACEHOLDER, response)
+
+    def put(self, key: str, username: str, response: str):
+        """
+        Store answer variant
+
+        Args:
+            key: Key from make_key()
+            username: Username the answer was generated for
+            response: AI answer
+        """
+        # Answers usually address the user by name
+        template = self.make_template(username, response)
+        if template is None:
+            return
+
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry.created_at > self.ttl:
+            entry = CacheEntry()
+            self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        if template not in entry.variants:
+            entry.variants.append(template)
+            if len(entry.variants) > self.max_variants:
+                entry.variants.pop(0)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def begin(self, key: str) -> Optional[asyncio.Future]:
+        """
+        Register an in-flight computation (single-flight)
+
+        Returns:
+            Existing future to wait on, or None if caller should compute
+            and then call finish()
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        self._in_flight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def finish(self, key: str, username: str, response: Optional[str]):
+        """Complete computation registered with begin()"""
+        future = self._in_flight.pop(key, None)
+        if response:
+            self.put(key, username, response)
+        if future is None or future.done():
+            return
+        # None (failed, cut off or not shareable): waiters generate their own answer
+        future.set_result(self.make_template(username, response) if response else None)
+
+    async def wait(self, future: asyncio.Future, username: str) -> Optional[str]:
+        """Wait for another caller's computation returned by begin(), None if it can't be shared"""
+        template = await asyncio.shield(future)
+        return template.replace(USERNAME_PLACEHOLDER, username) if template is not None else None
+
+    def stats(self) -> dict:
+        """Cache counters"""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+        }
@@ -0,0 +1,190 @@
+"""
+Ingestion guards: per-user rate limiting and near-duplicate (copypasta) detection
+"""
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utils.word_matcher import normalize_words
+
+
+class TokenBucketLimiter:
+    """
+    Per-user token bucket
+
+    Every chatter gets burst tokens that refill at rate per second; a
+    message costs one token. Buckets live in an LRU of max_users entries,
+    an evicted chatter simply starts with a full bucket again.
+    """
+
+    def __init__(self, rate: float, burst: float, max_users: int):
+        """
+        Initialize limiter
+
+        Args:
+            rate: Tokens per second
+            burst: Bucket size
+            max_users: Chatters tracked
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()  # username -> (tokens, updated)
+
+        # Stats
+        self.allowed = 0
+        self.limited = 0
+
+    def allow(self, username: str, now: float = None) -> bool:
+        """Take a token for username, False if the bucket is empty"""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(username, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+            self.allowed += 1
+        else:
+            self.limited += 1
+
+        self._buckets[username] = (tokens, now)
+        if len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    def stats(self) -> dict:
+        return {'allowed': self.allowed, 'limited': self.limited, 'users': len(self._buckets)}
+
+
+class NearDuplicateDetector:
+    """
+    Detects variants of a recent message (copypasta raids) in O(1) per message
+
+    Text is normalized like banned words (look-alikes, separators,
+    repeats) and cut into character shingles. A one-permutation MinHash
+    signature (each shingle hashed once into one of num_bins bins) is
+    split into LSH bands; a message whose band matches one seen within
+    window seconds and whose estimated Jaccard similarity reaches
+    threshold is a duplicate. Band buckets expire from a time-ordered
+    queue, so memory is bounded by the window.
+    """
+
+    EMPTY = 0xFFFFFFFF
+
+    def __init__(
+        self,
+        window: float,
+        threshold: float,
+        min_length: int = 12,
+        shingle: int = 4,
+        num_bins: int = 32,
+        bands: int = 8,
+    ):
+        """
+        Initialize detector
+
+        Args:
+            window: Seconds a message is remembered (refreshed by each duplicate)
+            threshold: Estimated Jaccard similarity that counts as duplicate
+            min_length: Shorter normalized texts are never checked
+            shingle: Characters per shingle
+            num_bins: Signature length
+            bands: LSH bands (num_bins must divide evenly)
+        """
+        self.window = window
+        self.threshold = threshold
+        self.min_length = min_length
+        self.shingle = shingle
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+
+        self._buckets: Dict[Tuple[int, tuple], int] = {}  # (band, values) -> entry id
+        self._entries: Dict[int, Tuple[tuple, float]] = {}  # entry id -> (signature, seen)
+        self._expiry: Deque[Tuple[float, int]] = deque()  # (seen, entry id), oldest first
+        self._next_id = 0
+
+        # Stats
+        self.checked = 0
+        self.duplicates = 0
+
+    def signature(self, text: str) -> Optional[tuple]:
+        """One-permutation MinHash of text, None if it is too short to judge"""
+        stream = ' '.join(normalize_words(text))
+        if len(stream) < self.min_length:
+            return None
+        bins = [self.EMPTY] * self.num_bins
+        for i in range(len(stream) - self.shingle + 1):
+            value = zlib.crc32(stream[i:i + self.shingle].encode('utf-8'))
+            slot = value % self.num_bins
+            value //= self.num_bins
+            if value < bins[slot]:
+                bins[slot] = value
+        return tuple(bins)
+
+    def similarity(self, a: tuple, b: tuple) -> float:
+        """Estimated Jaccard similarity of two signatures (bins empty in both are ignored)"""
+        used = same = 0
+        for x, y in zip(a, b):
+            if x == self.EMPTY and y == self.EMPTY:
+                continue
+            used += 1
+            same += x == y
+        return same / used if used else 0.0
+
+    def _band_keys(self, signature: tuple) -> List[Tuple[int, tuple]]:
+        keys = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            if any(value != self.EMPTY for value in values):
+                keys.append((band, values))
+        return keys
+
+    def is_duplicate(self, text: str, now: float = None) -> bool:
+        """
+        Check text against the window and remember it
+
+        Returns:
+            True if text is a variant of a message seen within the window
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+
+        signature = self.signature(text)
+        if signature is None:
+            return False
+        self.checked += 1
+
+        keys = self._band_keys(signature)
+        duplicate = False
+        for key in keys:
+            entry = self._entries.get(self._buckets.get(key))
+            if entry and self.similarity(signature, entry[0]) >= self.threshold:
+                duplicate = True
+                break
+
+        # Remember it either way: a running raid stays suppressed while it lasts
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (signature, now)
+        self._expiry.append((now, entry_id))
+        for key in keys:
+            self._buckets[key] = entry_id
+
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+    def _expire(self, now: float):
+        """Forget entries older than the window, amortized O(1) per message"""
+        while self._expiry and now - self._expiry[0][0] > self.window:
+            _, entry_id = self._expiry.popleft()
+            signature, _ = self._entries.pop(entry_id)
+            for key in self._band_keys(signature):
+                if self._buckets.get(key) == entry_id:
+                    del self._buckets[key]
+
+    def stats(self) -> dict:
+        return {'checked': self.checked, 'duplicates': self.duplicates, 'remembered': len(self._entries)}
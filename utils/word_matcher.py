@@ -0,0 +1,163 @@
+"""
+Banned-word matching: text normalization and an Aho-Corasick automaton
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Latin letters and digits that look like Cyrillic ones (after lower())
+CONFUSABLES = str.maketrans({
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у',
+    '0': 'о', '3': 'з', '4': 'ч', '6': 'б', '@': 'а',
+    'ё': 'е',
+})
+
+# Everything inside a word that is not a letter: "х.у.й", "ху*й", "х_у_й"
+NON_LETTER = re.compile(r'[\W\d_]+', re.UNICODE)
+
+# "хуууй" -> runs х, у×3, й
+REPEATS = re.compile(r'(.)\1*')
+
+
+def normalize_words(text: str) -> List[str]:
+    """
+    Normalize text into words for matching
+
+    Lowercase, look-alike letters folded to Cyrillic, ё -> е, separators
+    inside words dropped, and runs of single-letter words joined
+    ("х у й" -> "хуй"). Repeated letters are kept, see letter_runs().
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Normalized words
+    """
+    words = []
+    letters = []
+    for token in text.lower().translate(CONFUSABLES).split():
+        word = NON_LETTER.sub('', token)
+        if not word:
+            continue
+        if len(word) == 1:
+            letters.append(word)
+            continue
+        if letters:
+            words.append(''.join(letters))
+            letters = []
+        words.append(word)
+    if letters:
+        words.append(''.join(letters))
+    return words
+
+
+def letter_runs(words: List[str]) -> Tuple[str, List[int]]:
+    """
+    Collapse repeated letters of ' w1 w2 ... ', keeping the run lengths
+
+    Returns:
+        (collapsed stream, length of every run)
+    """
+    stream = []
+    counts = []
+    for match in REPEATS.finditer(' ' + ' '.join(words)):
+        stream.append(match.group(1))
+        counts.append(len(match.group(0)))
+    return ''.join(stream), counts
+
+
+class WordMatcher:
+    """
+    Finds banned words in one pass over the normalized message
+
+    All entries are compiled into one Aho-Corasick automaton over the word
+    stream ' w1 w2 ... ' with repeated letters collapsed, so matching is
+    linear in message length no matter how long the list is. A candidate
+    then needs at least as many repeats of every letter as the entry
+    itself ("хуууй" matches "хуй", "as" doesn't match "ass"). An entry
+    matches a whole word; entries ending with '*' match any ending
+    ("хуе*"). An entry of several words matches that phrase.
+    """
+
+    def __init__(self, entries: Iterable[str]):
+        """
+        Compile automaton
+
+        Args:
+            entries: Banned words ('stem*' for any ending)
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (entry, stem, run lengths) for every entry ending there
+        self._out: List[List[Tuple[str, bool, List[int]]]] = [[]]
+        self.size = 0
+
+        for entry in entries:
+            self._add(entry)
+        self._link()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _add(self, entry: str):
+        entry = entry.strip()
+        stem = entry.endswith('*')
+        words = normalize_words(entry.rstrip('*'))
+        if not words:
+            return
+
+        chars, counts = letter_runs(words)
+        state = 0
+        for char in chars:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((entry, stem, counts))
+        self.size += 1
+
+    def _link(self):
+        """Breadth-first failure links, outputs of suffix states merged in"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find(self, text: str) -> Optional[str]:
+        """
+        First banned entry found in text
+
+        Args:
+            text: Raw message
+
+        Returns:
+            Matched entry as written in the list, or None
+        """
+        if not self.size:
+            return None
+        stream, counts = letter_runs(normalize_words(text))
+        stream += ' '
+        goto, fail, out = self._goto, self._fail, self._out
+
+        state = 0
+        for i, char in enumerate(stream):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for entry, stem, needed in out[state]:
+                if not stem and stream[i + 1] != ' ':
+                    continue
+                start = i + 1 - len(needed)
+                if all(have >= need for have, need in zip(counts[start:i + 1], needed)):
+                    return entry
+        return None
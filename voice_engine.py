@@ -2,13 +2,123 @@
 Voice Engine - Text-to-Speech module with audio enhancement
 """
 import asyncio
-import os
+import io
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from gtts import gTTS
-from pydub import AudioSegment
-from pydub.effects import normalize, compress_dynamic_range
 import config
-from typing import Optional
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+from utils.clip_cache import ClipCache, clip_key
+from utils.audio_pool import AudioProcessPool
+
+# gTTS, pydub and NumPy are imported on first use (pydub/NumPy normally only
+# in audio worker processes), so they don't slow down startup
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+# TTS language
+TTS_LANG = 'ru'
+
+# Post-processing parameters, part of the clip cache key
+ENHANCEMENT_PARAMS = {
+    'pitch_octaves': 0.25,  # ~3 semitones higher
+    'headroom': 0.1,
+    'threshold': -20.0,
+    'ratio': 4.0,
+    'attack': 5.0,
+    'release': 50.0,
+    'low_pass': 8000,
+    'high_pass': 100,
+    'bitrate': '128k',
+}
+
+
+def enhance_pydub(audio: 'AudioSegment', params: dict) -> 'AudioSegment':
+    """
+    Reference enhancement chain on pydub (pure Python, slow)
+    
+    Args:
+        audio: Decoded audio
+        params: ENHANCEMENT_PARAMS
+        
+    Returns:
+        Enhanced audio
+    """
+    from pydub.effects import normalize, compress_dynamic_range
+    
+    # 1. Pitch shift to make voice higher/more feminine (+3 semitones)
+    # Note: This is a simple speed-then-resample method
+    octaves = params['pitch_octaves']
+    new_sample_rate = int(audio.frame_rate * (2.0 ** octaves))
+    pitched_audio = audio._spawn(audio.raw_data, overrides={'frame_rate': new_sample_rate})
+    pitched_audio = pitched_audio.set_frame_rate(audio.frame_rate)
+    
+    # 2. Normalize volume (make louder)
+    normalized_audio = normalize(pitched_audio, headroom=params['headroom'])
+    
+    # 3. Dynamic range compression (smoother, more professional)
+    compressed_audio = compress_dynamic_range(
+        normalized_audio,
+        threshold=params['threshold'],
+        ratio=params['ratio'],
+        attack=params['attack'],
+        release=params['release']
+    )
+    
+    # 4. Add slight bass boost (warmth)
+    # Low shelf filter at 200Hz
+    bass_boosted = compressed_audio.low_pass_filter(params['low_pass']).high_pass_filter(params['high_pass'])
+    
+    return bass_boosted
+
+
+def enhance_segment(audio: 'AudioSegment', params: dict, engine: str = None) -> 'AudioSegment':
+    """Run enhancement chain selected by engine (default: config.DSP_ENGINE)"""
+    if (engine or config.DSP_ENGINE) == 'numpy':
+        from utils.dsp import enhance_numpy
+        return enhance_numpy(audio, params)
+    return enhance_pydub(audio, params)
+
+
+def render_enhanced(audio_data: bytes, params: dict, engine: str, envelope_fps: float) -> Tuple[bytes, float, bytes]:
+    """
+    Decode, enhance and encode a clip (runs in AudioProcessPool workers)
+    
+    Args:
+        audio_data: Original mp3 bytes
+        params: ENHANCEMENT_PARAMS
+        engine: 'numpy' or 'pydub'
+        envelope_fps: Lip-sync envelope rate
+        
+    Returns:
+        (enhanced mp3 bytes, duration in seconds, lip-sync envelope)
+    """
+    from pydub import AudioSegment
+    from utils.dsp import loudness_envelope, segment_to_array
+    
+    audio = AudioSegment.from_file(io.BytesIO(audio_data), format='mp3')
+    enhanced = enhance_segment(audio, params, engine)
+    
+    # Mouth opening per video frame, computed once here instead of in every viewer
+    envelope = loudness_envelope(
+        segment_to_array(enhanced),
+        enhanced.frame_rate,
+        enhanced.max_possible_amplitude,
+        fps=envelope_fps,
+    )
+    
+    buffer = io.BytesIO()
+    enhanced.export(buffer, format='mp3', bitrate=params['bitrate'])
+    return buffer.getvalue(), len(enhanced) / 1000.0, envelope.tobytes()
+
+
+@dataclass
+class AudioClip:
+    """Encoded (mp3) clip kept in memory"""
+    data: bytes
+    duration: float  # Seconds
+    text: str = ""
+    envelope: Optional[bytes] = None  # Lip-sync levels (uint8) at config.LIPSYNC_FPS
 
 
 class VoiceEngine:
@@ -23,124 +133,152 @@ class VoiceEngine:
         Path(config.AUDIO_OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
         
         self.is_speaking = False
-        self.current_audio_file: Optional[str] = None
         
-    async def text_to_speech(self, text: str) -> str:
+        # Rendered clips, reused for repeated text
+        self.clip_cache = ClipCache(config.AUDIO_CACHE_DIR, config.AUDIO_CACHE_MAX_BYTES)
+        self._pending_writes: Set[asyncio.Task] = set()
+        
+        # Post-processing runs in worker processes (no GIL contention with the event loop)
+        self.audio_pool: Optional[AudioProcessPool] = None
+        if config.AUDIO_WORKERS > 0:
+            self.audio_pool = AudioProcessPool(
+                workers=config.AUDIO_WORKERS,
+                max_pending=config.AUDIO_POOL_MAX_PENDING,
+                timeout=config.AUDIO_POOL_TIMEOUT,
+            )
+    
+    def start(self):
+        """Warm up enhancement workers before the first message"""
+        if self.audio_pool:
+            self.audio_pool.start()
+    
+    async def warm_up(self):
+        """Import gTTS off the event loop so the first message doesn't pay for it"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, __import__, 'gtts')
+    
+    async def synthesize(self, text: str) -> Optional[AudioClip]:
         """
-        Convert text to speech and save to file
+        Convert text to speech without touching the disk
         
         Args:
             text: Text to convert
-            
+        
         Returns:
-            Path to generated audio file
+            Enhanced clip or None on error
         """
         try:
-            # Generate unique filename
-            import time
-            filename = f"{config.AUDIO_OUTPUT_DIR}/speech_{int(time.time())}.mp3"
+            key = self._clip_key(text)
+            cached = await self.clip_cache.read_async(key)
+            if cached:
+                print(f"💾 Аудио из кэша: {text[:50]}...")
+                data, duration, envelope = cached
+                if duration is None:
+                    duration = self._mp3_duration(data)
+                return AudioClip(data=data, duration=duration, text=text, envelope=envelope)
             
             print(f"🎤 Генерация речи: {text[:50]}...")
             
             # Generate speech using Google TTS (free alternative)
             # Run in executor to avoid blocking
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: gTTS(text=text, lang='ru', slow=False).save(filename)
-            )
+            raw = await loop.run_in_executor(None, self._render_speech, text)
             
-            print(f"✓ Аудио сгенерировано: {filename}")
+            print(f"✓ Аудио сгенерировано ({len(raw)} bytes)")
             
             # Post-process audio to make it sound better
-            enhanced_filename = await self._enhance_audio(filename)
+            enhanced = await self._enhance_audio(raw)
+            if enhanced:
+                data, duration, envelope = enhanced
+                self._store_clip(key, data, duration, envelope)
+            else:
+                data, duration, envelope = raw, self._mp3_duration(raw), None
             
-            self.current_audio_file = enhanced_filename
-            return enhanced_filename
+            if config.AUDIO_DEBUG_DUMP:
+                self._dump_clip(data)
             
+            return AudioClip(data=data, duration=duration, text=text, envelope=envelope)
+        
         except Exception as e:
             print(f"❌ Ошибка генерации речи: {e}")
-            return ""
+            return None
+    
+    @staticmethod
+    def _clip_key(text: str) -> str:
+        """Clip cache key: text + everything that changes the rendered audio or its envelope"""
+        return clip_key(
+            text,
+            TTS_LANG,
+            {**ENHANCEMENT_PARAMS, 'engine': config.DSP_ENGINE, 'lipsync_fps': config.LIPSYNC_FPS},
+        )
+    
+    @staticmethod
+    def _render_speech(text: str) -> bytes:
+        """Run gTTS into a memory buffer"""
+        from gtts import gTTS
+        
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=TTS_LANG, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
     
-    async def _enhance_audio(self, audio_file: str) -> str:
+    def _store_clip(self, key: str, data: bytes, duration: float, envelope: Optional[bytes]):
+        """Write clip to the cache in the background, playback doesn't wait for it"""
+        task = asyncio.create_task(self.clip_cache.store_async(key, data, duration, envelope))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+    
+    @staticmethod
+    def _dump_clip(data: bytes):
+        """Save clip for debugging (AUDIO_DEBUG_DUMP)"""
+        filename = f"{config.AUDIO_OUTPUT_DIR}/speech_{time.time_ns()}.mp3"
+        with open(filename, 'wb') as f:
+            f.write(data)
+        print(f"🐞 Аудио сохранено: {filename}")
+    
+    async def _enhance_audio(self, audio_data: bytes) -> Optional[Tuple[bytes, float, bytes]]:
         """
         Enhance audio quality with post-processing
         
         Args:
-            audio_file: Path to original audio file
-            
+            audio_data: Original mp3 bytes
+        
         Returns:
-            Path to enhanced audio file
+            (enhanced mp3 bytes, duration in seconds, lip-sync envelope) or None on error
         """
         try:
             print("🎵 Улучшение качества голоса...")
             
-            # Load audio
-            audio = AudioSegment.from_mp3(audio_file)
-            
-            # 1. Pitch shift to make voice higher/more feminine (+3 semitones)
-            # Note: This is a simple speed-then-resample method
-            octaves = 0.25  # ~3 semitones higher
-            new_sample_rate = int(audio.frame_rate * (2.0 ** octaves))
-            pitched_audio = audio._spawn(audio.raw_data, overrides={'frame_rate': new_sample_rate})
-            pitched_audio = pitched_audio.set_frame_rate(audio.frame_rate)
-            
-            # 2. Normalize volume (make louder)
-            normalized_audio = normalize(pitched_audio, headroom=0.1)
-            
-            # 3. Dynamic range compression (smoother, more professional)
-            compressed_audio = compress_dynamic_range(
-                normalized_audio,
-                threshold=-20.0,
-                ratio=4.0,
-                attack=5.0,
-                release=50.0
-            )
-            
-            # 4. Add slight bass boost (warmth)
-            # Low shelf filter at 200Hz
-            bass_boosted = compressed_audio.low_pass_filter(8000).high_pass_filter(100)
-            
-            # Save enhanced audio
-            enhanced_file = audio_file.replace('.mp3', '_enhanced.mp3')
-            bass_boosted.export(enhanced_file, format='mp3', bitrate='128k')
-            
-            # Remove original file
-            try:
-                os.remove(audio_file)
-            except:
-                pass
-            
-            print("✓ Голос улучшен: +pitch, +громкость, +компрессия")
-            
-            return enhanced_file
+            args = (audio_data, ENHANCEMENT_PARAMS, config.DSP_ENGINE, config.LIPSYNC_FPS)
+            if self.audio_pool:
+                result, timing = await self.audio_pool.run(render_enhanced, *args)
+                print(
+                    f"✓ Голос улучшен: +pitch, +громкость, +компрессия "
+                    f"(очередь {timing['wait'] * 1000:.0f} мс, обработка {timing['run'] * 1000:.0f} мс)"
+                )
+            else:
+                loop = asyncio.get_event_loop()
+                result = await loop.run_in_executor(None, render_enhanced, *args)
+                print("✓ Голос улучшен: +pitch, +громкость, +компрессия")
             
+            return result
+        
         except Exception as e:
             print(f"⚠ Ошибка улучшения аудио: {e}, используем оригинал")
-            return audio_file
+            return None
     
-    async def get_audio_duration(self, audio_file: str) -> float:
-        """
-        Get audio file duration
-        
-        Args:
-            audio_file: Path to audio file
-            
-        Returns:
-            Duration in seconds
-        """
+    @staticmethod
+    def _mp3_duration(audio_data: bytes) -> float:
+        """Get mp3 duration from memory"""
         try:
             from mutagen.mp3 import MP3
-            audio = MP3(audio_file)
-            return audio.info.length
+            return MP3(io.BytesIO(audio_data)).info.length
         except:
-            # Fallback: estimate ~150 words per minute
-            import os
-            file_size = os.path.getsize(audio_file)
             # Rough estimate: 1 second per 4KB for speech
-            return file_size / 4000
+            return len(audio_data) / 4000
     
     def stop(self):
         """Stop current playback (cleanup)"""
         self.is_speaking = False
-
+        self.clip_cache.flush()
+        if self.audio_pool:
+            self.audio_pool.shutdown()
@@ -4,8 +4,12 @@ VRM Controller - WebSocket server for controlling VRM model animations
 import asyncio
 import websockets
 import json
-import base64
+import struct
 from typing import Set, Optional
+import config
+
+# Binary audio frame prefix: clip id (uint32, big-endian)
+CLIP_ID = struct.Struct('>I')
 
 
 class VRMController:
@@ -17,6 +21,8 @@ class VRMController:
         self.clients: Set[websockets.WebSocketServerProtocol] = set()
         self.server: Optional[websockets.WebSocketServer] = None
         self.is_running = False
+        self._clip_id = 0
+        self.client_connected = asyncio.Event()  # Set when the first viewer connects
         
     async def start(self):
         """Start WebSocket server"""
@@ -29,6 +35,19 @@ class VRMController:
             self.port
         )
         
+    async def wait_for_client(self, timeout: float) -> bool:
+        """
+        Wait until a viewer is connected
+        
+        Returns:
+            False on timeout
+        """
+        try:
+            await asyncio.wait_for(self.client_connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        
     async def stop(self):
         """Stop WebSocket server"""
         self.is_running = False
@@ -39,6 +58,7 @@ class VRMController:
     async def _handle_client(self, websocket):
         """Handle new WebSocket client"""
         self.clients.add(websocket)
+        self.client_connected.set()
         print(f"✓ Клиент подключен: {websocket.remote_address}")
         
         try:
@@ -63,29 +83,83 @@ class VRMController:
             "action": "stop_talking"
         })
     
-    async def play_audio(self, audio_file_path: str):
+    async def play_audio_bytes(self, audio_data: bytes, duration: float = 0.0, envelope: Optional[bytes] = None):
         """
-        Send audio file to browser for playback
+        Send in-memory audio to browser for playback
         
         Args:
-            audio_file_path: Path to audio file
+            audio_data: Encoded (mp3) audio
+            duration: Clip duration in seconds (informational)
+            envelope: Lip-sync levels (uint8) at config.LIPSYNC_FPS
         """
         try:
-            # Read audio file and encode to base64
-            with open(audio_file_path, 'rb') as f:
-                audio_data = f.read()
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            clip_id = await self.begin_audio(duration=duration, size=len(audio_data), envelope=envelope)
             
-            await self._broadcast({
-                "action": "play_audio",
-                "audio": audio_base64
-            })
+            view = memoryview(audio_data)
+            for offset in range(0, len(view), config.AUDIO_CHUNK_SIZE):
+                await self.send_audio_chunk(clip_id, view[offset:offset + config.AUDIO_CHUNK_SIZE])
+            
+            await self.end_audio(clip_id)
             
             print(f"✓ Аудио отправлено в браузер ({len(audio_data)} bytes)")
             
         except Exception as e:
             print(f"❌ Ошибка отправки аудио: {e}")
     
+    async def begin_audio(
+        self,
+        mime: str = "audio/mpeg",
+        duration: float = 0.0,
+        size: int = 0,
+        envelope: Optional[bytes] = None,
+    ) -> int:
+        """
+        Announce a new clip, its bytes follow as binary frames
+        
+        Args:
+            mime: Audio MIME type
+            duration: Clip duration in seconds (0 if unknown)
+            size: Total size in bytes (0 if unknown, e.g. while encoding)
+            envelope: Lip-sync levels (uint8) at config.LIPSYNC_FPS
+            
+        Returns:
+            Clip id for send_audio_chunk() / end_audio()
+        """
+        self._clip_id = (self._clip_id + 1) & 0xFFFFFFFF
+        header = {
+            "action": "audio_start",
+            "id": self._clip_id,
+            "mime": mime,
+            "duration": duration,
+            "size": size,
+        }
+        if envelope:
+            header["envelope"] = list(envelope)
+            header["envelope_fps"] = config.LIPSYNC_FPS
+        await self._broadcast(header)
+        return self._clip_id
+    
+    async def send_audio_chunk(self, clip_id: int, chunk):
+        """
+        Send part of a clip as one binary frame: 4-byte big-endian clip id + bytes
+        
+        Args:
+            clip_id: Id from begin_audio()
+            chunk: bytes-like audio data
+        """
+        if not self.clients:
+            return
+        websockets.broadcast(self.clients, CLIP_ID.pack(clip_id) + chunk)
+        # Let other tasks (and the socket writers) run between chunks
+        await asyncio.sleep(0)
+    
+    async def end_audio(self, clip_id: int):
+        """Mark clip as complete"""
+        await self._broadcast({
+            "action": "audio_end",
+            "id": clip_id,
+        })
+    
     async def _broadcast(self, message: dict):
         """Broadcast message to all connected clients"""
         if not self.clients:
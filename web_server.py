@@ -4,10 +4,16 @@ Simple HTTP server for serving VRM viewer
 import http.server
 import socketserver
 import os
+import threading
 from pathlib import Path
 
 PORT = 3000
 
+
+class ReusableTCPServer(socketserver.TCPServer):
+    # Restart right after a crash without waiting for TIME_WAIT on the port
+    allow_reuse_address = True
+
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
         # Allow CORS
@@ -16,14 +22,21 @@ class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
         super().end_headers()
 
-def start_server():
-    """Start HTTP server"""
+def start_server(ready: threading.Event = None):
+    """
+    Start HTTP server
+    
+    Args:
+        ready: Set as soon as the port is bound
+    """
     # Change to project root
     os.chdir(Path(__file__).parent)
     
     handler = MyHTTPRequestHandler
     
-    with socketserver.TCPServer(("", PORT), handler) as httpd:
+    with ReusableTCPServer(("", PORT), handler) as httpd:
+        if ready:
+            ready.set()
         print(f"🌐 HTTP сервер запущен на http://localhost:{PORT}")
         print(f"📂 Раздаю файлы из: {os.getcwd()}")
         print(f"🎨 Откройте VRM viewer: http://localhost:{PORT}/web/vrm_viewer.html")